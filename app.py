@@ -1,13 +1,20 @@
+import os
+
 from flask import Flask
 from wsgiref.simple_server import make_server
 
 from blueprint import api_blueprint, errors
+from schemas import bcrypt
 
 app = Flask(__name__)
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(32).hex())
+app.config['TOKEN_MAX_AGE'] = int(os.environ.get('TOKEN_MAX_AGE', 3600))
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+bcrypt.init_app(app)
 
-with make_server('', 5000, app) as server:
-    app.register_blueprint(api_blueprint, url_prefix="/api")
-    app.register_blueprint(errors, url_prefix="/api")
-    # server.serve_forever()
-
+app.register_blueprint(api_blueprint, url_prefix="/api")
+app.register_blueprint(errors, url_prefix="/api")
 
+if __name__ == '__main__':
+    with make_server('', 5000, app) as server:
+        server.serve_forever()
@@ -0,0 +1,48 @@
+import os
+
+from sqlalchemy.orm import aliased
+
+import db_utils
+import text_delta
+from models import *
+
+# Every version is stored as a delta against the latest full snapshot, and a new snapshot is taken once the
+# article is SNAPSHOT_INTERVAL versions past it, so reading any version decodes at most one delta.
+SNAPSHOT_INTERVAL = int(os.environ.get('ARTICLE_SNAPSHOT_INTERVAL', 16))
+
+
+def latest_snapshot(article_id):
+    return Session.query(ArticleRevision.version, ArticleRevision.text_data) \
+        .filter(ArticleRevision.article_id == article_id, ArticleRevision.base_version.is_(None)) \
+        .order_by(ArticleRevision.version.desc()).first()
+
+
+def record(article):
+    text = article.text or ''
+    revision_data = {'article_id': article.id, 'version': article.version, 'name': article.name}
+    snapshot = latest_snapshot(article.id) if article.version > 0 else None
+    if snapshot is None or article.version - snapshot.version >= SNAPSHOT_INTERVAL:
+        revision_data['text_data'] = text_delta.compress(text)
+    else:
+        revision_data['base_version'] = snapshot.version
+        revision_data['text_data'] = text_delta.encode(text_delta.decompress(snapshot.text_data), text)
+    db_utils.create_entry(ArticleRevision, commit=False, **revision_data)
+
+
+def get(article_id, version):
+    base = aliased(ArticleRevision)
+    row = Session.query(ArticleRevision.name, ArticleRevision.text_data, base.text_data, Article.creator_id) \
+        .join(Article, Article.id == ArticleRevision.article_id) \
+        .outerjoin(base, and_(base.article_id == ArticleRevision.article_id,
+                              base.version == ArticleRevision.base_version)) \
+        .filter(ArticleRevision.article_id == article_id, ArticleRevision.version == version) \
+        .one_or_none()
+    if row is None:
+        return None
+
+    name, text_data, base_data, creator_id = row
+    if base_data is None:
+        text = text_delta.decompress(text_data)
+    else:
+        text = text_delta.decode(text_delta.decompress(base_data), text_data)
+    return Article(id=article_id, name=name, text=text, version=version, creator_id=creator_id)
@@ -0,0 +1,197 @@
+import os
+import re
+from collections import defaultdict, namedtuple
+from html import escape
+from threading import Lock
+
+from models import *
+
+SEARCH_CONFIG = os.environ.get('ARTICLE_SEARCH_CONFIG', 'english')
+# Headlines are HTML: the article text is escaped and matches are wrapped in <b>. ts_headline marks matches with
+# control characters instead, so the markers can be added after its output has been escaped.
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+HEADLINE_OPTIONS = f'StartSel={START_SEL}, StopSel={STOP_SEL}, MinWords=15, MaxWords=35, MaxFragments=2'
+
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+HEADLINE_CONTEXT_WORDS = 5
+HEADLINE_MAX_WORDS = 35
+
+WORD = re.compile(r'\w+')
+
+SearchResult = namedtuple('SearchResult', 'id name version creator_id rank headline')
+
+
+def uses_postgresql():
+    return engine.dialect.name == 'postgresql'
+
+
+def search_vector(name, text):
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(name, '')), 'A') \
+        .op('||')(func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(text, '')), 'B'))
+
+
+# Extra values for an INSERT or UPDATE of `values` that keep Article.search_vector in step with it. Columns that
+# are not being written are read from the row, so a name-only update re-indexes the current text.
+def indexed_values(values):
+    if not uses_postgresql():
+        return {}
+    return {'search_vector': search_vector(values.get('name', Article.name), values.get('text', Article.text))}
+
+
+def record(article):
+    if not uses_postgresql():
+        index.add(article)
+
+
+def remove(article_id):
+    if not uses_postgresql():
+        index.remove(article_id)
+
+
+def clear():
+    index.clear()
+
+
+def cursor(result):
+    return f'{result.rank!r},{result.id}'
+
+
+def search(query_text, *, after=None, limit=20):
+    if uses_postgresql():
+        results = search_postgresql(query_text, after, limit + 1)
+    else:
+        results = index.search(query_text, after, limit + 1)
+    if len(results) > limit:
+        results = results[:limit]
+        return results, cursor(results[-1])
+    return results, None
+
+
+def search_postgresql(query_text, after, limit):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, query_text)
+    # float8, so the rank in a cursor compares equal to the rank of the row it was taken from
+    rank = cast(func.ts_rank(Article.search_vector, query), Float)
+    matches = select(Article.id, Article.name, Article.text, Article.version, Article.creator_id, rank.label('rank')) \
+        .where(Article.search_vector.op('@@')(query))
+    if after is not None:
+        after_rank, after_id = after
+        matches = matches.where(or_(rank < after_rank, and_(rank == after_rank, Article.id > after_id)))
+    matches = matches.order_by(rank.desc(), Article.id).limit(limit).subquery()
+
+    # ts_headline is expensive, so it only runs for the rows on the page. Marker characters already in the text
+    # are dropped so that they cannot be taken for matches.
+    unmarked_text = func.translate(matches.c.text, START_SEL + STOP_SEL, '')
+    rows = Session.execute(
+        select(matches.c.id, matches.c.name, matches.c.version, matches.c.creator_id, matches.c.rank,
+               func.ts_headline(SEARCH_CONFIG, unmarked_text, query, HEADLINE_OPTIONS))
+        .order_by(matches.c.rank.desc(), matches.c.id)
+    ).all()
+    return [SearchResult(*row[:-1], highlight(row[-1])) for row in rows]
+
+
+def highlight(headline_text):
+    if headline_text is None:
+        return None
+    return escape(headline_text).replace(START_SEL, '<b>').replace(STOP_SEL, '</b>')
+
+
+def tokenize(text):
+    return [word.lower() for word in WORD.findall(text or '')]
+
+
+def headline(text, terms):
+    words = list(WORD.finditer(text or ''))
+    if not words:
+        return None if text is None else escape(text)
+    matches = [position for position, word in enumerate(words) if word.group().lower() in terms]
+    start = max(0, matches[0] - HEADLINE_CONTEXT_WORDS) if matches else 0
+    parts = []
+    offset = words[start].start()
+    for word in words[start:start + HEADLINE_MAX_WORDS]:
+        parts.append(escape(text[offset:word.start()]))
+        parts.append(f'<b>{escape(word.group())}</b>' if word.group().lower() in terms else escape(word.group()))
+        offset = word.end()
+    if start + HEADLINE_MAX_WORDS >= len(words):
+        parts.append(escape(text[offset:]))
+    return ''.join(parts)
+
+
+# Fallback for databases without full-text search. It matches whole lowercased words without stemming or stop
+# words, and lives in the process, so it is meant for development and the test suite rather than for several
+# workers sharing one database.
+class InvertedIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.loaded = False
+        self.lock = Lock()
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            self.loaded = False
+
+    def load(self):
+        articles = Session.query(Article) \
+            .options(load_only(Article.id, Article.name, Article.text, Article.version, Article.creator_id)).all()
+        with self.lock:
+            if not self.loaded:
+                for article in articles:
+                    self.add_locked(article)
+                self.loaded = True
+
+    def add(self, article):
+        with self.lock:
+            if self.loaded:
+                self.add_locked(article)
+
+    def add_locked(self, article):
+        self.remove_locked(article.id)
+        weights = defaultdict(float)
+        for term in tokenize(article.name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(article.text):
+            weights[term] += TEXT_WEIGHT
+        for term, weight in weights.items():
+            self.postings[term][article.id] = weight
+        self.documents[article.id] = (article.name, article.text, article.version, article.creator_id, weights)
+
+    def remove(self, article_id):
+        with self.lock:
+            self.remove_locked(article_id)
+
+    def remove_locked(self, article_id):
+        document = self.documents.pop(article_id, None)
+        if document is not None:
+            for term in document[-1]:
+                self.postings[term].pop(article_id, None)
+                if not self.postings[term]:
+                    del self.postings[term]
+
+    def search(self, query_text, after, limit):
+        if not self.loaded:
+            self.load()
+        terms = set(tokenize(query_text))
+        if not terms:
+            return []
+
+        with self.lock:
+            postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+            ranked = []
+            for article_id in postings[0]:
+                if all(article_id in posting for posting in postings[1:]):
+                    ranked.append((-sum(posting[article_id] for posting in postings), article_id))
+            ranked.sort()
+            if after is not None:
+                after_key = (-after[0], after[1])
+                ranked = [key for key in ranked if key > after_key]
+            documents = [(key, self.documents[key[1]]) for key in ranked[:limit]]
+
+        return [SearchResult(article_id, name, version, creator_id, -rank, headline(text, terms))
+                for (rank, article_id), (name, text, version, creator_id, _) in documents]
+
+
+index = InvertedIndex()
@@ -0,0 +1,47 @@
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+MAX_ENTRIES = int(os.environ.get('ARTICLE_VERSION_CACHE_SIZE', 10000))
+TTL = float(os.environ.get('ARTICLE_VERSION_CACHE_TTL', 2))
+
+versions = OrderedDict()
+versions_lock = Lock()
+
+
+def etag(article_id, version, creator_id):
+    return f'{article_id}.{version}.{creator_id}'
+
+
+def get(article_id):
+    with versions_lock:
+        entry = versions.get(article_id)
+        if entry is None:
+            return None
+        tag, expires_at = entry
+        if expires_at < time.monotonic():
+            del versions[article_id]
+            return None
+        versions.move_to_end(article_id)
+        return tag
+
+
+def put(article):
+    tag = etag(article.id, article.version, article.creator_id)
+    with versions_lock:
+        versions[article.id] = (tag, time.monotonic() + TTL)
+        versions.move_to_end(article.id)
+        while len(versions) > MAX_ENTRIES:
+            versions.popitem(last=False)
+    return tag
+
+
+def invalidate(article_id):
+    with versions_lock:
+        versions.pop(article_id, None)
+
+
+def clear():
+    with versions_lock:
+        versions.clear()
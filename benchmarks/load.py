@@ -0,0 +1,390 @@
+"""Latency and requests/sec of every operation in openapi.yaml under a mixed workload.
+
+Recreates the schema in --database-url, seeds it with --size articles and
+proportional users, changes and reviews from check_models.py, starts gunicorn (gunicorn.conf.py) against it and
+runs browse, propose, review, admin and account scenarios from keep-alive
+clients, each in its own process. Prints p50/p95/p99 latency and requests/sec
+per operation as JSON and, with --baseline, how they moved against an earlier
+report. The database at --database-url is dropped first.
+
+    python benchmarks/load.py --database-url sqlite:////tmp/load.db --size 1000 --output load.json
+    python benchmarks/load.py --database-url postgresql://postgres@localhost/load --baseline load.json
+    python benchmarks/load.py --compare new.json --baseline load.json
+"""
+import argparse
+import base64
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from serving import ROOT, wait_until_ready
+
+PASSWORD = 'benchmark'
+WORDS = ('news', 'market', 'science', 'kitten', 'football', 'weather', 'election', 'music', 'travel', 'health',
+         'economy', 'space', 'history', 'energy', 'school', 'garden', 'city', 'river', 'cinema', 'robot')
+DEFAULT_MIX = 'browse=60,propose=15,review=15,admin=5,account=5'
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps')
+
+
+def load_operations():
+    import yaml
+
+    with open(os.path.join(ROOT, 'openapi.yaml')) as file:
+        spec = yaml.safe_load(file)
+    return {operation['operationId']: (method.upper(), path)
+            for path, methods in spec['paths'].items()
+            for method, operation in methods.items() if 'operationId' in operation}
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count)).capitalize() + '.'
+
+
+def seed(database_url, size, seed_value):
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, ROOT)
+    import check_models
+    from models import BaseModel, Session, engine
+
+    BaseModel.metadata.drop_all(engine)
+    BaseModel.metadata.create_all(engine)
+    summary = check_models.generate(users=max(10, size // 5), articles=size, changes=size * 2, seed=seed_value)
+    Session.remove()
+    engine.dispose()
+    staff = summary['admins'] + summary['moderators']
+    return {'articles': size, 'changes': summary['changes'], 'users': summary['users'], 'first_user_id': staff + 1,
+            'password': check_models.PASSWORD, 'admin': check_models.username(1),
+            'moderators': [check_models.username(user_id) for user_id in range(summary['admins'] + 1, staff + 1)],
+            'regular_users': [check_models.username(user_id) for user_id in range(staff + 1, summary['users'] + 1)]}
+
+
+class Client:
+    def __init__(self, port, operations):
+        self.port = port
+        self.operations = operations
+        self.connection = http.client.HTTPConnection('127.0.0.1', port)
+        self.samples = []
+        self.recording = False
+
+    def call(self, operation_id, token=None, params=None, query=None, body=None, headers=None):
+        method, path = self.operations[operation_id]
+        url = '/api' + path.format(**(params or {}))
+        if query:
+            url += '?' + urlencode(query)
+        headers = dict(headers or {})
+        if token is not None:
+            headers['Authorization'] = f'Bearer {token}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        self.connection.request(method, url, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            self.samples.append((operation_id, response.status, elapsed))
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        is_json = response.getheader('Content-Type', '').startswith('application/json')
+        return response.status, json.loads(data) if is_json and data else None
+
+    def login(self, username, password):
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        status, body = self.call('loginUser', headers={'Authorization': f'Basic {credentials}'})
+        if status != 200:
+            raise RuntimeError(f'cannot log in as {username}: {status}')
+        return body['token']
+
+
+# A response body with every field, so that a dry run takes the branches that need a successful response.
+class AnyBody:
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, key):
+        return self if isinstance(key, int) else 1
+
+
+# Records the operations the scenarios send without sending them.
+class DryRunClient(Client):
+    def __init__(self, operations):
+        self.operations = operations
+        self.sent = set()
+
+    def call(self, operation_id, token=None, params=None, query=None, body=None, headers=None):
+        _, path = self.operations[operation_id]
+        path.format(**(params or {}))
+        self.sent.add(operation_id)
+        return 202 if (query or {}).get('async') else 200, AnyBody()
+
+
+def browse(client, rng, state):
+    article_id = rng.randint(1, state['articles'])
+    client.call('listArticles', state['user'], query={'limit': 20, 'after': rng.randint(0, state['articles'])})
+    client.call('getArticleById', state['user'], {'articleId': article_id})
+    client.call('getArticleById', state['user'], {'articleId': article_id}, {'version': 0})
+    client.call('getArticleHistory', state['user'], {'articleId': article_id})
+    client.call('searchArticles', state['user'], query={'q': rng.choice(WORDS)})
+    ids = sorted(rng.sample(range(1, state['articles'] + 1), min(10, state['articles'])))
+    client.call('listArticles', state['user'], query={'ids': ','.join(map(str, ids))})
+    client.call('batchGetChanges', state['user'], body={'ids': rng.sample(range(1, state['changes'] + 1), 10)})
+
+
+def propose(client, rng, state):
+    article_id = rng.randint(1, state['articles'])
+    status, change = client.call('addChange', state['user'], body={
+        'article_id': article_id, 'new_text': words(rng, rng.randint(30, 150))})
+    if status == 200:
+        client.call('getChangeById', state['user'], {'changeId': change['id']})
+    client.call('getUserChanges', state['user'], query={'limit': 20})
+    client.call('listReviewsByChangesDone', state['user'], query={'limit': 20})
+
+
+def review(client, rng, state):
+    status, page = client.call('getChangesInReview', state['moderator'], query={
+        'limit': 20, 'after': rng.randint(0, state['changes'])})
+    if status == 200 and page:
+        change_id = rng.choice(page)['id']
+        client.call('getChangeById', state['moderator'], {'changeId': change_id})
+        client.call('createReview', state['moderator'], body={
+            'change_id': change_id, 'verdict': rng.random() < 0.4, 'comment': words(rng, 5)})
+        client.call('getReviewByChangeId', state['moderator'], {'changeId': change_id})
+    client.call('listReviewsDone', state['moderator'], query={'limit': 20})
+
+
+def admin(client, rng, state):
+    status, article = client.call('addArticle', state['admin'], body={
+        'name': words(rng, 3)[:100], 'text': words(rng, rng.randint(30, 150))})
+    if status == 200:
+        article_id = article['id']
+        client.call('updateArticle', state['admin'], {'articleId': article_id}, body={'name': words(rng, 3)[:100]},
+                    headers={'If-Match': str(article['version'])})
+        # a denied review that is then overturned, which applies the change
+        status, change = client.call('addChange', state['admin'], body={
+            'article_id': article_id, 'new_text': words(rng, 80)})
+        if status == 200:
+            client.call('createReview', state['admin'], body={
+                'change_id': change['id'], 'verdict': False, 'comment': 'Not yet'})
+            client.call('updateReview', state['admin'], {'changeId': change['id']},
+                        body={'verdict': True, 'comment': 'Fine after all'})
+        status, change = client.call('addChange', state['admin'], body={
+            'article_id': article_id, 'new_text': words(rng, 80)})
+        if status == 200:
+            client.call('deleteChange', state['admin'], {'changeId': change['id']})
+        client.call('deleteArticle', state['admin'], {'articleId': article_id})
+    user_ids = rng.sample(range(1, state['users'] + 1), min(10, state['users']))
+    client.call('batchGetUsers', state['admin'], body={'ids': user_ids})
+    client.call('updateStatusUser', state['admin'], {'userId': state['first_user_id']}, body={'user_status': 2})
+    client.call('getPoolStatus', state['admin'])
+    client.call('getMetrics', state['admin'])
+
+
+def account(client, rng, state):
+    state['created'] += 1
+    username = f'load{state["index"]}-{state["created"]}'
+    status, user = client.call('createUser', body={
+        'username': username, 'password': PASSWORD, 'first_name': 'Load', 'last_name': 'Test',
+        'email': f'{username}@load.test', 'phone': '380000000000'})
+    if status != 200:
+        return
+    token = client.login(username, PASSWORD)
+    client.call('getUserById', token, {'userId': user['id']})
+    client.call('updateUser', token, {'userId': user['id']}, body={'phone': '380000000001'})
+    client.call('logoutUser', token)
+    if state['created'] % 2:
+        client.call('deleteUser', state['admin'], {'userId': user['id']})
+    else:
+        status, job = client.call('deleteUser', state['admin'], {'userId': user['id']}, {'async': 1})
+        if status == 202:
+            client.call('getJob', state['admin'], {'jobId': job['id']})
+
+
+SCENARIOS = {'browse': browse, 'propose': propose, 'review': review, 'admin': admin, 'account': account}
+
+
+# Operations each scenario sends, from a dry run, so that openapi.yaml routes without a workload are caught. Every
+# scenario runs twice, since account alternates between synchronous and asynchronous deletes.
+def scenario_operations(operations, names):
+    client = DryRunClient(operations)
+    rng = random.Random(0)
+    state = {'articles': 10, 'changes': 10, 'users': 10, 'first_user_id': 1, 'index': 0, 'created': 0,
+             'admin': 'token', 'user': 'token', 'moderator': 'token'}
+    for name in names:
+        for _ in range(2):
+            SCENARIOS[name](client, rng, state)
+    # run_client logs every client in
+    return client.sent | {'loginUser'}
+
+
+def run_client(args):
+    index, port, operations, dataset, mix, seed_value, warmup, duration = args
+    rng = random.Random(f'{seed_value}-{index}')
+    client = Client(port, operations)
+    password = dataset['password']
+    state = dict(dataset, index=index, created=0, admin=client.login(dataset['admin'], password),
+                 user=client.login(rng.choice(dataset['regular_users']), password),
+                 moderator=client.login(rng.choice(dataset['moderators']), password))
+    names, weights = zip(*mix.items())
+
+    started = time.monotonic()
+    while time.monotonic() < started + warmup + duration:
+        client.recording = time.monotonic() >= started + warmup
+        SCENARIOS[rng.choices(names, weights)[0]](client, rng, state)
+    return client.samples
+
+
+def percentile(latencies, fraction):
+    if not latencies:
+        return None
+    return latencies[max(0, math.ceil(len(latencies) * fraction) - 1)] * 1000
+
+
+def summarize(latencies, statuses, duration):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def run(args, operations, dataset, mix):
+    env = dict(os.environ, DATABASE_URL=args.database_url, SECRET_KEY='load-test', WEB_WORKERS=str(args.workers),
+               WEB_THREADS=str(args.threads), BIND=f'127.0.0.1:{args.port}')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(args.port)
+        with multiprocessing.Pool(args.concurrency) as pool:
+            results = pool.map(run_client, [(index, args.port, operations, dataset, mix, args.seed, args.warmup,
+                                         args.duration) for index in range(args.concurrency)])
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    for operation_id, status, elapsed in (sample for result in results for sample in result):
+        latencies[operation_id].append(elapsed)
+        statuses[operation_id][status] += 1
+
+    report = {operation_id: dict(zip(('method', 'path'), operations[operation_id]),
+                                 **summarize(latencies[operation_id], statuses[operation_id], args.duration))
+              for operation_id in sorted(latencies)}
+    total_statuses = defaultdict(int)
+    for operation_statuses in statuses.values():
+        for status, count in operation_statuses.items():
+            total_statuses[status] += count
+    return {
+        'config': {'database': args.database_url.split(':', 1)[0], 'size': args.size, 'seed': args.seed,
+                   'workers': args.workers, 'threads': args.threads, 'concurrency': args.concurrency,
+                   'duration': args.duration, 'mix': mix, 'cpus': os.cpu_count(),
+                   'python': platform.python_version()},
+        'total': summarize([elapsed for values in latencies.values() for elapsed in values], total_statuses,
+                           args.duration),
+        'operations': report,
+        'not_sampled': sorted(set(operations) - set(latencies)),
+    }
+
+
+# Relative change of every metric against the baseline. Latencies regress when they grow, rps when it drops.
+def compare(report, baseline, tolerance):
+    lines = [f'{"operation":28} {"metric":7} {"baseline":>10} {"current":>10} {"change":>8}']
+    regressions = []
+    entries = [('total', report['total'], baseline['total'])]
+    entries += [(operation_id, values, baseline['operations'][operation_id])
+                for operation_id, values in report['operations'].items() if operation_id in baseline['operations']]
+    for name, current, previous in entries:
+        for metric in METRICS:
+            if not previous[metric] or current[metric] is None:
+                continue
+            change = current[metric] / previous[metric] - 1
+            worse = -change if metric == 'rps' else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  regression'
+                regressions.append((name, metric))
+            lines.append(f'{name:28} {metric:7} {previous[metric]:10.1f} {current[metric]:10.1f} {change:+8.1%}{flag}')
+    return lines, regressions
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}, expected one of {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'sqlite:////tmp/load.db'))
+    parser.add_argument('--size', type=int, default=1000, help='seeded articles; users and changes scale with it')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    parser.add_argument('--compare', help='compare this stored report with --baseline instead of running')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare) as file:
+            report = json.load(file)
+    else:
+        operations = load_operations()
+        covered = scenario_operations(operations, args.mix)
+        missing = sorted(set(operations) - scenario_operations(operations, SCENARIOS))
+        if missing:
+            parser.error(f'no scenario sends {", ".join(missing)}; add it to a scenario')
+        print(f'seeding {args.size} articles into {args.database_url}', file=sys.stderr)
+        dataset = seed(args.database_url, args.size, args.seed)
+        print(f'{args.concurrency} clients, {args.warmup:g}s warmup, {args.duration:g}s measured', file=sys.stderr)
+        report = run(args, operations, dataset, args.mix)
+        report['not_sampled'] = sorted(set(report['not_sampled']) | (set(operations) - covered))
+        if report['not_sampled']:
+            print(f'warning: no samples for {", ".join(report["not_sampled"])}', file=sys.stderr)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as file:
+                file.write(text + '\n')
+        else:
+            print(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        changed = sorted(key for key, value in report['config'].items() if baseline['config'].get(key) != value)
+        if changed:
+            print(f'warning: the baseline was run with a different {", ".join(changed)}', file=sys.stderr)
+        lines, regressions = compare(report, baseline, args.tolerance)
+        print('\n'.join(lines), file=sys.stderr)
+        if regressions:
+            print(f'{len(regressions)} metrics regressed by more than {args.tolerance:.0%}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare the marshmallow + jsonify path with the compiled serializers.
+
+Dumps N transient rows of each Info schema through both paths inside a
+request context, checks that the response bodies are byte-identical and
+prints the best time of several runs. No database is needed.
+
+    python benchmarks/serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify  # noqa: E402
+
+import serializers  # noqa: E402
+import text_delta  # noqa: E402
+from app import app  # noqa: E402
+from models import Article, ArticleRevision, Change, Review, User  # noqa: E402
+from schemas import ArticleInfo, ChangeInfo, ReviewInfo, UserInfo  # noqa: E402
+
+TEXT = 'Something big happened. And the UFO was in the lead. ' * 20
+REVISION = ArticleRevision(article_id=1, version=0, text=TEXT)
+
+
+def rows(count):
+    return {
+        UserInfo: [User(id=i, username=f'user{i}', first_name='Margo', last_name='Colson', email='marcol@gmail.com',
+                        phone='380671234567', user_status=2) for i in range(count)],
+        ArticleInfo: [Article(id=i, name='News 2.0', text=TEXT, version=i % 7, creator_id=1) for i in range(count)],
+        ChangeInfo: [Change(id=i, article_id=1, article_version=0, revision=REVISION,
+                            new_text_delta=text_delta.encode(TEXT, TEXT + 'Edit.'), status='in review', proposer_id=2)
+                     for i in range(count)],
+        ReviewInfo: [Review(id=i, change_id=i, verdict=i % 2 == 0, comment='All is good', reviewer_id=1)
+                     for i in range(count)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{args.rows} rows, best of {args.repeat}, encoder: {"orjson" if serializers.orjson else "json"}')
+    print('schema        marshmallow ms  compiled ms  speedup')
+    with app.test_request_context():
+        for schema_class, data in rows(args.rows).items():
+            def marshmallow_path():
+                return jsonify(schema_class().dump(data, many=True)).get_data()
+
+            def compiled_path():
+                return serializers.dump_response(schema_class, data, many=True).get_data()
+
+            if marshmallow_path() != compiled_path():
+                raise SystemExit(f'{schema_class.__name__}: responses differ')
+
+            slow = min(timeit.repeat(marshmallow_path, number=1, repeat=args.repeat)) * 1000
+            fast = min(timeit.repeat(compiled_path, number=1, repeat=args.repeat)) * 1000
+            print(f'{schema_class.__name__:12s}  {slow:14.1f}  {fast:11.1f}  {slow / fast:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
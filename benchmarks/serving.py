@@ -0,0 +1,109 @@
+"""Requests/sec of the gunicorn entry point for different worker counts.
+
+Starts gunicorn (gunicorn.conf.py) once per worker count, drives it with
+keep-alive HTTP clients running in separate processes and prints one
+line per run. Needs the database from models.py to be reachable; an
+article is created when there is none.
+
+    python benchmarks/serving.py --workers 1 2 4 8 --concurrency 32 --duration 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed():
+    import db_utils
+    from models import Article, BaseModel, Session, User, engine
+
+    BaseModel.metadata.create_all(engine)
+    article = Session.query(Article.id).first()
+    if article is None:
+        user = Session.query(User.id).first() or db_utils.create_entry(User, username='benchmark', user_status=0)
+        article = db_utils.create_entry(Article, name='Benchmark', text='Benchmark text. ' * 100, version=0,
+                                        creator_id=user.id)
+    Session.remove()
+    return article.id
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/hello-world')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def client(args):
+    port, path, duration = args
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+    return latencies
+
+
+def run(workers, threads, concurrency, duration, port, path):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads), BIND=f'127.0.0.1:{port}')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port)
+        with multiprocessing.Pool(concurrency) as pool:
+            results = pool.map(client, [(port, path, duration)] * concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        'workers': workers,
+        'threads': threads,
+        'requests': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--path', help='defaults to GET /api/article/<seeded id>')
+    args = parser.parse_args()
+
+    path = args.path or f'/api/article/{seed()}'
+    print(f'GET {path}, {args.concurrency} keep-alive clients, {args.duration:g}s per run, {os.cpu_count()} CPUs')
+    print('workers  threads  requests      rps   p50 ms   p99 ms')
+    for workers in args.workers:
+        result = run(workers, args.threads, args.concurrency, args.duration, args.port, path)
+        print('{workers:7d}  {threads:7d}  {requests:8d}  {rps:7.0f}  {p50_ms:7.1f}  {p99_ms:7.1f}'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,47 @@
 import sqlalchemy
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, make_response
 import marshmallow
 from flask_bcrypt import check_password_hash
-from flask_httpauth import HTTPBasicAuth
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 
+import article_revisions
+import article_search
+import article_versions
 import db_utils
+import jobs
+import metrics
+import serializers
+import text_delta
 from schemas import *
 from models import *
 
 api_blueprint = Blueprint('api', __name__)
 StudentID = 5
-auth = HTTPBasicAuth()
-
-session = Session()
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth(scheme='Bearer')
+auth = MultiAuth(basic_auth, token_auth)
 
 errors = Blueprint('errors', __name__)
 
 
+@api_blueprint.before_app_request
+def start_request():
+    metrics.start_request()
+
+
+@api_blueprint.after_app_request
+def finish_request(response):
+    return metrics.finish_request(response)
+
+
+@api_blueprint.teardown_app_request
+def remove_session(error):
+    if error is not None:
+        Session.rollback()
+    Session.remove()
+
+
 @api_blueprint.route('/hello-world')
 def hello_world_ex():
     return 'Hello World!'
@@ -27,14 +52,36 @@ def hello_world():
     return f'Hello World {StudentID}', 200
 
 
-@auth.verify_password
+@basic_auth.verify_password
 def verify_password(username, password):
-    user = session.query(User).filter_by(username=username).first()
-    if user is not None and check_password_hash(user.password, password):
-        return user
+    with metrics.timed(metrics.auth_duration, 'basic'):
+        user = Session.query(User).filter_by(username=username).first()
+        if user is not None and check_password_hash(user.password, password):
+            return user
+
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='auth-token')
+
+
+def generate_token(user):
+    return token_serializer().dumps({'id': user.id, 'version': user.token_version})
+
+
+@token_auth.verify_token
+def verify_token(token):
+    with metrics.timed(metrics.auth_duration, 'bearer'):
+        try:
+            data = token_serializer().loads(token, max_age=current_app.config['TOKEN_MAX_AGE'])
+        except BadSignature:
+            return None
+
+        user = Session.query(User).options(load_only(User.id, User.user_status, User.token_version)) \
+            .filter_by(id=data['id']).first()
+        if user is not None and user.token_version == data['version']:
+            return user
 
 
-@auth.error_handler
 def auth_error(status):
     response = {
         'error': {
@@ -47,6 +94,10 @@ def auth_error(status):
     return jsonify(response), 403
 
 
+basic_auth.error_handler(auth_error)
+token_auth.error_handler(auth_error)
+
+
 @errors.app_errorhandler(sqlalchemy.exc.IntegrityError)
 def handle_error(error):
     response = {
@@ -60,6 +111,19 @@ def handle_error(error):
     return jsonify(response), 400
 
 
+@errors.app_errorhandler(db_utils.VersionConflict)
+def handle_error(error):
+    response = {
+        'error': {
+            'code': 409,
+            'type': 'CONFLICT',
+            'message': str(error)
+        }
+    }
+
+    return jsonify(response), 409
+
+
 @errors.app_errorhandler(marshmallow.exceptions.ValidationError)
 def handle_error(error):
     response = {
@@ -73,10 +137,68 @@ def handle_error(error):
     return jsonify(response), 400
 
 
+def page_response(entries, schema_class, next_cursor, only=None):
+    response = serializers.dump_response(schema_class, entries, many=True, only=only)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+def batch_response(model_class, schema_class, ids, allowed=None, only=None):
+    entries = db_utils.get_entries_by_ids(model_class, ids,
+                                          options=db_utils.schema_columns(model_class, schema_class, only))
+    items = []
+    for entry_id in ids:
+        entry = entries.get(entry_id)
+        if entry is None:
+            error = {'code': 404, 'type': 'NOT_FOUND', 'message': f'{model_class.__name__} not found'}
+        elif allowed is not None and not allowed(entry):
+            error = {'code': 403, 'type': 'FORBIDDEN', 'message': 'Not enough permissions'}
+        else:
+            items.append(serializers.dump(schema_class, entry, only=only))
+            continue
+        items.append({'id': entry_id, 'error': error})
+    return serializers.response(items)
+
+
+@api_blueprint.route("/metrics", methods=["GET"])
+@auth.login_required()
+def get_metrics():
+    if auth.current_user().user_status != 0:
+        response = {
+            'error': {
+                'code': 403,
+                'type': 'FORBIDDEN',
+                'message': 'Not enough permissions'
+            }
+        }
+
+        return jsonify(response), 403
+
+    return current_app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@api_blueprint.route("/pool", methods=["GET"])
+@auth.login_required()
+def get_pool_status():
+    if auth.current_user().user_status != 0:
+        response = {
+            'error': {
+                'code': 403,
+                'type': 'FORBIDDEN',
+                'message': 'Not enough permissions'
+            }
+        }
+
+        return jsonify(response), 403
+
+    return jsonify(pool_status())
+
+
 @api_blueprint.route("/user", methods=["POST"])
 def create_user():
     user_data = UserCreate().load(request.json)
-    if len(session.query(User).filter_by(username=user_data['username']).all()) > 0:
+    if Session.query(User.id).filter_by(username=user_data['username']).first() is not None:
         response = {
             'error': {
                 'code': 400,
@@ -87,18 +209,26 @@ def create_user():
 
         return jsonify(response), 400
 
-    if len(session.query(User).all()) > 0:
+    if Session.query(User.id).first() is not None:
         user_data['user_status'] = 2
     else:
         user_data['user_status'] = 0
 
     user = db_utils.create_entry(User, **user_data)
-    return jsonify(UserInfo().dump(user))
+    return serializers.dump_response(UserInfo, user)
+
+
+def can_access_user(current_user, user_id):
+    return current_user.id == user_id or current_user.user_status == 0
+
+
+def can_view_change(current_user, change):
+    return current_user.id == change.proposer_id or current_user.user_status != 2
 
 
 def check_this_user_or_admin(user_id):
     try:
-        user = db_utils.get_entry_by_id(User, user_id)
+        user = db_utils.get_entry_by_id(User, user_id, options=[load_only(User.id)])
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -110,7 +240,7 @@ def check_this_user_or_admin(user_id):
 
         return jsonify(response), 404
 
-    if auth.current_user().id is not user.id and auth.current_user().user_status is not 0:
+    if not can_access_user(auth.current_user(), user.id):
         response = {
             'error': {
                 'code': 403,
@@ -129,9 +259,18 @@ def get_user_by_id(user_id):
     if resp is not None:
         return resp
 
-    user = db_utils.get_entry_by_id(User, user_id)
+    user = db_utils.get_entry_by_id(User, user_id, options=db_utils.schema_columns(User, UserInfo))
+
+    return serializers.dump_response(UserInfo, user)
+
+
+@api_blueprint.route("/user/batch-get", methods=["POST"])
+@auth.login_required()
+def batch_get_users():
+    ids = BatchGet().load(request.json)['ids']
+    current_user = auth.current_user()
 
-    return jsonify(UserInfo().dump(user))
+    return batch_response(User, UserInfo, ids, allowed=lambda user: can_access_user(current_user, user.id))
 
 
 @api_blueprint.route("/user/<int:user_id>", methods=["PUT"])
@@ -142,8 +281,11 @@ def update_user(user_id):
         return resp
 
     user_data = UserUpdate().load(request.json)
+    if 'password' in user_data:
+        # A new password revokes the tokens issued under the old one, as logging out does.
+        user_data['token_version'] = User.token_version + 1
     user_updated = db_utils.update_entry(User, user_id, **user_data)
-    return jsonify(UserInfo().dump(user_updated))
+    return serializers.dump_response(UserInfo, user_updated)
 
 
 @api_blueprint.route("/user/<int:user_id>", methods=["DELETE"])
@@ -153,29 +295,57 @@ def delete_user(user_id):
     if resp is not None:
         return resp
 
-    empty_user = session.query(User).filter_by(username='empty_user').first()
-    if empty_user is None:
-        user_data = {'id': 0, 'username': 'empty_user'}
-        db_utils.create_entry(User, **user_data)
+    if request.args.get('async') in ('1', 'true'):
+        job = jobs.submit(auth.current_user().id, reassign_and_delete_user, user_id)
+        return jsonify(jobs.job_info(job)), 202
 
-    reviews = session.query(Review).filter_by(reviewer_id=user_id).all()
-    review_data = {'reviewer_id': 0}
-    for review in reviews:
-        db_utils.update_entry(Review, review.id, **review_data)
+    reassign_and_delete_user(user_id)
+    return jsonify({"code": 200, "message": "OK", "type": "OK"})
 
-    changes = session.query(Change).filter_by(proposer_id=user_id).all()
-    change_data = {'proposer_id': 0}
-    for change in changes:
-        db_utils.update_entry(Change, change.id, **change_data)
 
-    articles = session.query(Article).filter_by(creator_id=user_id).all()
-    article_data = {'creator_id': 0}
-    for article in articles:
-        db_utils.update_entry(Article, article.id, **article_data)
+def reassign_and_delete_user(user_id):
+    with db_utils.transaction() as session:
+        empty_user = session.query(User).filter_by(username='empty_user').first()
+        if empty_user is None:
+            user_data = {'id': 0, 'username': 'empty_user'}
+            db_utils.create_entry(User, commit=False, **user_data)
 
-    db_utils.delete_entry(User, user_id)
-    logout_user()
-    return jsonify({"code": 200, "message": "OK", "type": "OK"})
+        db_utils.update_where(Review, {'reviewer_id': user_id}, {'reviewer_id': 0}, commit=False)
+        db_utils.update_where(Change, {'proposer_id': user_id}, {'proposer_id': 0}, commit=False)
+        db_utils.update_where(Article, {'creator_id': user_id}, {'creator_id': 0}, commit=False)
+
+        db_utils.delete_entry(User, user_id, commit=False)
+
+    article_versions.clear()
+
+
+@api_blueprint.route("/job/<job_id>", methods=["GET"])
+@auth.login_required()
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        response = {
+            'error': {
+                'code': 404,
+                'type': 'NOT_FOUND',
+                'message': 'Job not found'
+            }
+        }
+
+        return jsonify(response), 404
+
+    if auth.current_user().id != job.owner_id and auth.current_user().user_status != 0:
+        response = {
+            'error': {
+                'code': 403,
+                'type': 'FORBIDDEN',
+                'message': 'Not enough permissions'
+            }
+        }
+
+        return jsonify(response), 403
+
+    return jsonify(jobs.job_info(job))
 
 
 @api_blueprint.route("/user/changeStatus/<int:user_id>", methods=["PUT"])
@@ -193,7 +363,7 @@ def update_user_status(user_id):
         return jsonify(response), 403
 
     try:
-        user = db_utils.get_entry_by_id(User, user_id)
+        user = db_utils.get_entry_by_id(User, user_id, options=[load_only(User.id)])
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -218,8 +388,8 @@ def update_user_status(user_id):
 
         return jsonify(response), 400
 
-    admins = session.query(User).filter_by(user_status=0).all()
-    if len(admins) < 2 and user_id == auth.current_user().id:
+    admins = Session.query(User.id).filter_by(user_status=0).limit(2).count()
+    if admins < 2 and user_id == auth.current_user().id:
         response = {
             'error': {
                 'code': 400,
@@ -231,11 +401,11 @@ def update_user_status(user_id):
         return jsonify(response), 400
 
     user_updated = db_utils.update_entry(User, user_id, **user_data)
-    return jsonify(UserInfo().dump(user_updated))
+    return serializers.dump_response(UserInfo, user_updated)
 
 
 @api_blueprint.route("/user/login", methods=["GET"])
-@auth.login_required()
+@basic_auth.login_required()
 def login_user():
     user = auth.current_user()
 
@@ -246,12 +416,15 @@ def login_user():
     else:
         role = 'user'
 
-    return jsonify({'id': user.id, 'role': role}), 200
+    return jsonify({'id': user.id, 'role': role, 'token': generate_token(user),
+                    'expires_in': current_app.config['TOKEN_MAX_AGE']}), 200
 
 
 @api_blueprint.route("/user/logout", methods=["POST"])
+@auth.login_required()
 def logout_user():
-    return jsonify(msg="Not implemented"), 200
+    db_utils.update_entry(User, auth.current_user().id, token_version=User.token_version + 1)
+    return jsonify({"code": 200, "message": "OK", "type": "OK"})
 
 
 @api_blueprint.route("/article", methods=["POST"])
@@ -271,14 +444,64 @@ def create_article():
     article_data = ArticleCreate().load(request.json)
     article_data['version'] = 0
     article_data['creator_id'] = auth.current_user().id
-    article = db_utils.create_entry(Article, **article_data)
-    return jsonify(ArticleInfo().dump(article))
+    with db_utils.transaction():
+        article = db_utils.create_entry(Article, commit=False, **article_data,
+                                        **article_search.indexed_values(article_data))
+        article_revisions.record(article)
+    article_search.record(article)
+    response = serializers.dump_response(ArticleInfo, article)
+    response.set_etag(article_versions.etag(article.id, article.version, article.creator_id))
+    return response
+
+
+@api_blueprint.route("/article", methods=["GET"])
+def list_articles():
+    list_args = ArticleListArgs().load(request.args)
+    only = list_args['only']
+    if list_args['ids'] is not None:
+        return batch_response(Article, ArticleInfo, list_args['ids'], only=only)
+
+    articles_query = Session.query(Article).options(*db_utils.schema_columns(Article, ArticleInfo, only))
+    if list_args['creator_id'] is not None:
+        articles_query = articles_query.filter_by(creator_id=list_args['creator_id'])
+    if list_args['min_version'] is not None:
+        articles_query = articles_query.filter(Article.version >= list_args['min_version'])
+    articles, next_cursor = db_utils.paginate(articles_query, Article.id, after=list_args['after'],
+                                              limit=list_args['limit'])
+    return page_response(articles, ArticleInfo, next_cursor, only=only)
+
+
+@api_blueprint.route("/article/search", methods=["GET"])
+def search_articles():
+    search_args = ArticleSearchArgs().load(request.args)
+
+    results, next_cursor = article_search.search(search_args['q'], after=search_args['after'],
+                                                 limit=search_args['limit'])
+    return page_response(results, ArticleSearchResult, next_cursor)
 
 
 @api_blueprint.route("/article/<int:article_id>", methods=["GET"])
 def get_article_by_id(article_id):
+    if 'version' in request.args:
+        return get_article_version(article_id, ArticleVersionArgs().load(request.args)['version'])
+
+    if request.if_none_match:
+        etag = article_versions.get(article_id)
+        if etag is None:
+            try:
+                article = db_utils.get_entry_by_id(
+                    Article, article_id, options=[load_only(Article.version, Article.creator_id)]
+                )
+            except sqlalchemy.exc.NoResultFound:
+                article = None
+            if article is not None:
+                etag = article_versions.put(article)
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
     try:
-        article = db_utils.get_entry_by_id(Article, article_id)
+        article = db_utils.get_entry_by_id(Article, article_id,
+                                           options=db_utils.schema_columns(Article, ArticleInfo))
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -290,7 +513,61 @@ def get_article_by_id(article_id):
 
         return jsonify(response), 404
 
-    return jsonify(ArticleInfo().dump(article))
+    response = serializers.dump_response(ArticleInfo, article)
+    response.set_etag(article_versions.put(article))
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_article_version(article_id, version):
+    article = article_revisions.get(article_id, version)
+    if article is None:
+        response = {
+            'error': {
+                'code': 404,
+                'type': 'NOT_FOUND',
+                'message': 'Article version not found'
+            }
+        }
+
+        return jsonify(response), 404
+
+    etag = article_versions.etag(article.id, article.version, article.creator_id)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+
+    response = serializers.dump_response(ArticleInfo, article)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@api_blueprint.route("/article/<int:article_id>/history", methods=["GET"])
+def get_article_history(article_id):
+    page = PageArgs().load(request.args)
+
+    revisions_query = Session.query(ArticleRevision) \
+        .options(*db_utils.schema_columns(ArticleRevision, ArticleRevisionInfo)).filter_by(article_id=article_id)
+    revisions, next_cursor = db_utils.paginate(revisions_query, ArticleRevision.version, **page)
+    if not revisions and Session.query(Article.id).filter_by(id=article_id).first() is None:
+        response = {
+            'error': {
+                'code': 404,
+                'type': 'NOT_FOUND',
+                'message': 'Article not found'
+            }
+        }
+
+        return jsonify(response), 404
+
+    return page_response(revisions, ArticleRevisionInfo, next_cursor)
+
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 
 @api_blueprint.route("/article/<int:article_id>", methods=["PUT"])
@@ -307,9 +584,32 @@ def update_article(article_id):
 
         return jsonify(response), 403
 
+    article_data = ArticleUpdate().load(request.json)
+    expected_versions = if_match_versions()
+
     try:
-        article = db_utils.get_entry_by_id(Article, article_id)
-    except sqlalchemy.exc.NoResultFound:
+        with db_utils.transaction():
+            article_data.update(article_search.indexed_values(article_data))
+            if expected_versions is None:
+                article_updated = db_utils.update_entry(Article, article_id, commit=False,
+                                                        version=Article.version + 1, **article_data)
+            else:
+                article_updated = db_utils.update_versioned(Article, article_id, expected_versions, commit=False,
+                                                            **article_data)
+            article_revisions.record(article_updated)
+    except (sqlalchemy.exc.NoResultFound, db_utils.VersionConflict) as error:
+        if isinstance(error, db_utils.VersionConflict) and \
+                Session.query(Article.id).filter_by(id=article_id).first() is not None:
+            response = {
+                'error': {
+                    'code': 412,
+                    'type': 'PRECONDITION_FAILED',
+                    'message': str(error)
+                }
+            }
+
+            return jsonify(response), 412
+
         response = {
             'error': {
                 'code': 404,
@@ -320,10 +620,30 @@ def update_article(article_id):
 
         return jsonify(response), 404
 
-    article_data = ArticleUpdate().load(request.json)
-    article_data['version'] = db_utils.get_entry_by_id(Article, article_id).version + 1
-    article_updated = db_utils.update_entry(Article, article_id, **article_data)
-    return jsonify(ArticleInfo().dump(article_updated))
+    article_versions.invalidate(article_id)
+    article_search.record(article_updated)
+    response = serializers.dump_response(ArticleInfo, article_updated)
+    response.set_etag(article_versions.etag(article_updated.id, article_updated.version, article_updated.creator_id))
+    return response
+
+
+# None if any version will do, otherwise the versions named by the strong tags of If-Match. Weak tags are accepted
+# but never match, as If-Match compares strongly.
+def if_match_versions():
+    if_match = request.if_match
+    tags = if_match.as_set(include_weak=True)
+    if if_match.star_tag or not tags:
+        return None
+
+    versions = []
+    for tag in sorted(tags):
+        version = tag.split('.')[1] if tag.count('.') == 2 else tag
+        if not version.isdigit():
+            raise marshmallow.exceptions.ValidationError('If-Match must be an article version or ETag')
+        if if_match.is_strong(tag):
+            versions.append(int(version))
+
+    return versions
 
 
 @api_blueprint.route("/article/<int:article_id>", methods=["DELETE"])
@@ -341,7 +661,7 @@ def delete_article(article_id):
         return jsonify(response), 403
 
     try:
-        article = db_utils.get_entry_by_id(Article, article_id)
+        article = db_utils.get_entry_by_id(Article, article_id, options=[load_only(Article.id)])
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -353,13 +673,15 @@ def delete_article(article_id):
 
         return jsonify(response), 404
 
-    changes = session.query(Change).filter_by(article_id=article_id).all()
-    for change in changes:
-        review = session.query(Review).filter_by(change_id=change.id).one()
-        db_utils.delete_entry(Review, review.id)
-        db_utils.delete_entry(Change, change.id)
+    with db_utils.transaction():
+        article_changes = select(Change.id).where(Change.article_id == article_id)
+        db_utils.delete_where(Review, Review.change_id.in_(article_changes), commit=False,
+                              synchronize_session='fetch')
+        db_utils.delete_where(Change, {'article_id': article_id}, commit=False)
+        db_utils.delete_where(Article, {'id': article_id}, commit=False)
 
-    db_utils.delete_entry(Article, article_id)
+    article_versions.invalidate(article_id)
+    article_search.remove(article_id)
     return jsonify({"code": 200, "message": "OK", "type": "OK"})
 
 
@@ -369,7 +691,8 @@ def create_change():
     change_data = ChangeCreate().load(request.json)
 
     try:
-        article = db_utils.get_entry_by_id(Article, change_data['article_id'])
+        article = db_utils.get_entry_by_id(Article, change_data['article_id'],
+                                           options=[load_only(Article.version, Article.text)])
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -382,19 +705,19 @@ def create_change():
         return jsonify(response), 404
 
     change_data['article_version'] = article.version
-    change_data['old_text'] = article.text
+    change_data['new_text_delta'] = text_delta.encode(article.text, change_data.pop('new_text'))
     change_data['status'] = 'in review'
     change_data['proposer_id'] = auth.current_user().id
 
     change = db_utils.create_entry(Change, **change_data)
-    return jsonify(ChangeInfo().dump(change))
+    return serializers.dump_response(ChangeInfo, change)
 
 
 @api_blueprint.route("/change/<int:change_id>", methods=["GET"])
 @auth.login_required()
 def get_change_by_id(change_id):
     try:
-        change = db_utils.get_entry_by_id(Change, change_id)
+        change = db_utils.get_entry_by_id(Change, change_id, options=db_utils.schema_columns(Change, ChangeInfo))
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -406,7 +729,7 @@ def get_change_by_id(change_id):
 
         return jsonify(response), 404
 
-    if auth.current_user().id is not change.proposer_id and auth.current_user().user_status is 2:
+    if not can_view_change(auth.current_user(), change):
         response = {
             'error': {
                 'code': 403,
@@ -417,7 +740,16 @@ def get_change_by_id(change_id):
 
         return jsonify(response), 403
 
-    return jsonify(ChangeInfo().dump(change))
+    return serializers.dump_response(ChangeInfo, change)
+
+
+@api_blueprint.route("/change/batch-get", methods=["POST"])
+@auth.login_required()
+def batch_get_changes():
+    ids = BatchGet().load(request.json)['ids']
+    current_user = auth.current_user()
+
+    return batch_response(Change, ChangeInfo, ids, allowed=lambda change: can_view_change(current_user, change))
 
 
 @api_blueprint.route("/change/<int:change_id>", methods=["DELETE"])
@@ -435,7 +767,7 @@ def delete_change(change_id):
         return jsonify(response), 403
 
     try:
-        change = db_utils.get_entry_by_id(Change, change_id)
+        change = db_utils.get_entry_by_id(Change, change_id, options=[load_only(Change.id)])
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -447,11 +779,10 @@ def delete_change(change_id):
 
         return jsonify(response), 404
 
-    review = session.query(Review).filter_by(change_id=change.id).first()
-    if review is not None:
-        db_utils.delete_entry(Review, review.id)
+    with db_utils.transaction():
+        db_utils.delete_where(Review, {'change_id': change.id}, commit=False)
+        db_utils.delete_where(Change, {'id': change.id}, commit=False)
 
-    db_utils.delete_entry(Change, change.id)
     return jsonify({"code": 200, "message": "OK", "type": "OK"})
 
 
@@ -459,9 +790,12 @@ def delete_change(change_id):
 @auth.login_required()
 def my_changes():
     user_id = auth.current_user().id
+    page = PageArgs().load(request.args)
 
-    changes = session.query(Change).filter_by(proposer_id=user_id).all()
-    return jsonify(ChangeInfo().dump(changes, many=True))
+    changes_query = Session.query(Change).options(*db_utils.schema_columns(Change, ChangeInfo)) \
+        .filter_by(proposer_id=user_id)
+    changes, next_cursor = db_utils.paginate(changes_query, Change.id, **page)
+    return page_response(changes, ChangeInfo, next_cursor)
 
 
 @api_blueprint.route("/changesInReview", methods=["GET"])
@@ -478,8 +812,12 @@ def changes_in_review():
 
         return jsonify(response), 403
 
-    changes = session.query(Change).filter_by(status='in review').all()
-    return jsonify(ChangeInfo().dump(changes, many=True))
+    page = PageArgs().load(request.args)
+
+    changes_query = Session.query(Change).options(*db_utils.schema_columns(Change, ChangeInfo)) \
+        .filter_by(status='in review')
+    changes, next_cursor = db_utils.paginate(changes_query, Change.id, **page)
+    return page_response(changes, ChangeInfo, next_cursor)
 
 
 @api_blueprint.route("/review", methods=["POST"])
@@ -499,7 +837,7 @@ def create_review():
     review_data = ReviewCreate().load(request.json)
 
     try:
-        change = db_utils.get_entry_by_id(Change, review_data['change_id'])
+        change = db_utils.get_entry_by_id(Change, review_data['change_id'], options=accept_options)
     except sqlalchemy.exc.NoResultFound:
         response = {
             'error': {
@@ -511,7 +849,7 @@ def create_review():
 
         return jsonify(response), 404
 
-    if len(session.query(Review).filter_by(change_id=change.id).all()) > 0:
+    if Session.query(Review.id).filter_by(change_id=change.id).first() is not None:
         response = {
             'error': {
                 'code': 400,
@@ -523,23 +861,28 @@ def create_review():
         return jsonify(response), 400
 
     review_data['reviewer_id'] = auth.current_user().id
-    review_data['comment']
 
-    review = db_utils.create_entry(Review, **review_data)
+    article = None
+    with db_utils.transaction():
+        review = db_utils.create_entry(Review, commit=False, **review_data)
 
-    if review.verdict is True:
-        change_article(change)
-    else:
-        change_data = {'status': 'denied'}
-        db_utils.update_entry(Change, change.id, **change_data)
+        if review.verdict is True:
+            article = change_article(change)
+        else:
+            change_data = {'status': 'denied'}
+            db_utils.update_entry(Change, change.id, commit=False, **change_data)
 
-    return jsonify(ReviewInfo().dump(review))
+    article_versions.invalidate(change.article_id)
+    if article is not None:
+        article_search.record(article)
+
+    return serializers.dump_response(ReviewInfo, review)
 
 
 @api_blueprint.route("/review/<int:change_id>", methods=["GET"])
 @auth.login_required()
 def get_review_by_change_id(change_id):
-    review = session.query(Review).filter_by(change_id=change_id).first()
+    review = Session.query(Review).filter_by(change_id=change_id).first()
     if review is None:
         response = {
             'error': {
@@ -551,8 +894,8 @@ def get_review_by_change_id(change_id):
 
         return jsonify(response), 404
 
-    change = session.query(Change).filter_by(id=change_id).first()
-    if auth.current_user().id is not change.proposer_id and auth.current_user().user_status is 2:
+    change = Session.query(Change).options(load_only(Change.proposer_id)).filter_by(id=change_id).first()
+    if not can_view_change(auth.current_user(), change):
         response = {
             'error': {
                 'code': 403,
@@ -563,7 +906,7 @@ def get_review_by_change_id(change_id):
 
         return jsonify(response), 403
 
-    return jsonify(ReviewInfo().dump(review))
+    return serializers.dump_response(ReviewInfo, review)
 
 
 @api_blueprint.route("/review/<int:change_id>", methods=["PUT"])
@@ -580,7 +923,7 @@ def update_review(change_id):
 
         return jsonify(response), 403
 
-    review = session.query(Review).filter_by(change_id=change_id).first()
+    review = Session.query(Review).filter_by(change_id=change_id).first()
     if review is None:
         response = {
             'error': {
@@ -615,12 +958,16 @@ def update_review(change_id):
 
         return jsonify(response), 400
 
-    review_updated = db_utils.update_entry(Review, review.id, **review_data)
+    with db_utils.transaction():
+        review_updated = db_utils.update_entry(Review, review.id, commit=False, **review_data)
+
+        change = db_utils.get_entry_by_id(Change, review.change_id, options=accept_options)
+        article = change_article(change)
 
-    change = db_utils.get_entry_by_id(Change, review.change_id)
-    change_article(change)
+    article_versions.invalidate(change.article_id)
+    article_search.record(article)
 
-    return jsonify(ReviewInfo().dump(review_updated))
+    return serializers.dump_response(ReviewInfo, review_updated)
 
 
 @api_blueprint.route("/myReviews", methods=["GET"])
@@ -638,37 +985,41 @@ def get_my_reviews():
         return jsonify(response), 403
 
     user_id = auth.current_user().id
+    page = PageArgs().load(request.args)
 
-    reviews = session.query(Review).filter_by(reviewer_id=user_id).all()
-    return jsonify(ReviewInfo().dump(reviews, many=True))
+    reviews_query = Session.query(Review).options(*db_utils.schema_columns(Review, ReviewInfo)) \
+        .filter_by(reviewer_id=user_id)
+    reviews, next_cursor = db_utils.paginate(reviews_query, Review.id, **page)
+    return page_response(reviews, ReviewInfo, next_cursor)
 
 
 @api_blueprint.route("/myChangesReviewed", methods=["GET"])
 @auth.login_required()
 def get_my_changes_reviewed():
     user_id = auth.current_user().id
+    page = PageArgs().load(request.args)
 
-    reviews = []
+    reviews_query = Session.query(Review).options(*db_utils.schema_columns(Review, ReviewInfo)) \
+        .join(Change, Review.change_id == Change.id) \
+        .filter(Change.proposer_id == user_id)
+    reviews, next_cursor = db_utils.paginate(reviews_query, Review.change_id, **page)
+    return page_response(reviews, ReviewInfo, next_cursor)
 
-    changes = session.query(Change).filter_by(proposer_id=user_id).all()
-    for change in changes:
-        review = session.query(Review).filter_by(change_id=change.id).first()
-        if review is not None:
-            reviews.append(review)
 
-    return jsonify(ReviewInfo().dump(reviews, many=True))
+accept_options = [load_only(Change.article_id, Change.article_version, Change.new_text_delta),
+                  ArticleRevision.load_text(Change.revision)]
 
 
 def change_article(change):
-    article_data = {'text': change.new_text,
-                    'version': db_utils.get_entry_by_id(Article, change.article_id).version + 1}
-    db_utils.update_entry(Article, change.article_id, **article_data)
+    article_data = {'text': change.new_text}
+    article = db_utils.update_versioned(Article, change.article_id, change.article_version, commit=False,
+                                        **article_data, **article_search.indexed_values(article_data))
+    article_revisions.record(article)
 
     change_data = {'status': 'accepted'}
-    db_utils.update_entry(Change, change.id, **change_data)
-    changes_to_decline = session.query(Change).filter_by(status='in review', article_id=change.article_id,
-                                                         article_version=change.article_version).all()
+    db_utils.update_entry(Change, change.id, commit=False, **change_data)
+    db_utils.update_where(Change, {'status': 'in review', 'article_id': change.article_id,
+                                   'article_version': change.article_version}, {'status': 'denied'},
+                          commit=False)
 
-    change_data['status'] = 'denied'
-    for decline in changes_to_decline:
-        db_utils.update_entry(Change, decline.id, **change_data)
+    return article
@@ -1,32 +1,305 @@
+"""Fills the database with data.
+
+Without arguments it adds two users, articles, changes and reviews, enough to try the API by hand. With
+--articles it generates a large, skewed dataset instead, deterministic for a given --seed:
+
+    python check_models.py --articles 200000 --users 1000000 --changes 5000000 --seed 1 --reset
+
+Proposals per article follow a Zipf distribution, so a few hot articles get thousands of them, and proposers,
+reviewers and article creators are drawn the same way. The last proposals of every article are still in review;
+the earlier ones were accepted (each one a new article version and revision) or denied, and have a review.
+Every user is user<id> with the password PASSWORD; the first ids are admins, then moderators.
+"""
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from bisect import bisect_left
+from itertools import accumulate
+
+import article_revisions
+import article_search
+import db_utils
+import text_delta
 from models import *
+from schemas import bcrypt
+
+PASSWORD = 'password'
+BATCH_SIZE = 10000
+# change ids are k * CHANGE_ID_STRIDE mod n, so the proposals of one article are spread over the id range
+CHANGE_ID_STRIDE = 1000000007
+MAX_TEXT_LENGTH = 2000
+
+WORDS = ('the', 'a', 'of', 'and', 'in', 'to', 'is', 'was', 'for', 'on', 'with', 'new', 'city', 'market', 'energy',
+         'science', 'team', 'season', 'river', 'school', 'music', 'health', 'travel', 'kitten', 'robot', 'space',
+         'history', 'election', 'weather', 'garden', 'cinema', 'economy', 'football', 'festival', 'museum',
+         'bridge', 'report', 'council', 'research', 'island', 'winter', 'summer', 'company', 'village', 'library')
+FIRST_NAMES = ('Anna', 'Ivan', 'Olga', 'Petro', 'Maria', 'Taras', 'Sofia', 'Andrii', 'Iryna', 'Dmytro')
+LAST_NAMES = ('Kovalenko', 'Bondar', 'Melnyk', 'Shevchenko', 'Tkachenko', 'Kravets', 'Oliinyk', 'Lysenko')
+
+TABLES = {
+    'users': ('id', 'username', 'password', 'first_name', 'last_name', 'email', 'phone', 'user_status'),
+    'article': ('id', 'name', 'text', 'version', 'creator_id'),
+    'change': ('id', 'article_id', 'article_version', 'new_text_delta', 'status', 'proposer_id'),
+    'review': ('id', 'change_id', 'verdict', 'comment', 'reviewer_id'),
+    'article_revision': ('article_id', 'version', 'base_version', 'name', 'text_data'),
+}
+
+
+def sample():
+    users = db_utils.create_entries(User, [
+        dict(username='m2', first_name='Jake', last_name='Kikman', email='jakkik@gmail.com',
+             password='11111', phone='380558695222', user_status=0),
+        dict(username='softserve', first_name='Vanda', last_name='Maksimova', email='vanmak@gmail.com',
+             password='12345', phone='380962358712', user_status=1),
+    ], commit=False)
+    user_1, user_2 = users
+
+    articles = db_utils.create_entries(Article, [dict(row, **article_search.indexed_values(row)) for row in [
+        dict(name='IT news', text='Google is searching for ways to reassure people that it is still '
+                                  'out in front in the race for the best artificial intelligence technology. '
+                                  'And so far, the internet giant seems to be coming up with the wrong answer. '
+                                  'An advert designed to show off its new AI bot, showed it answering a query '
+                                  'incorrectly.',
+             creator_id=user_1.id, version=0),
+        dict(name='Kitties', text='A kitten is a juvenile cat. After being born, kittens display primary '
+                                  'altriciality and are totally dependent on their mothers for survival. They '
+                                  'normally do not open their eyes for seven to ten days. After about two weeks,'
+                                  'kittens develop quickly and begin to explore the world outside their nest. '
+                                  'After a further three to four weeks, they begin to eat solid food and grow '
+                                  'baby teeth. Domestic kittens are highly social animals and usually enjoy '
+                                  'human companionship.',
+             creator_id=user_2.id, version=0),
+    ]], commit=False)
+    article_1, article_2 = articles
+    for article in articles:
+        article_revisions.record(article)
+
+    changes = db_utils.create_entries(Change, [
+        dict(article_id=article_1.id, new_text_delta=text_delta.encode(article_1.text, 'Kitten, ha-ha-ha-ha'),
+             proposer_id=user_2.id, article_version=article_1.version),
+        dict(article_id=article_2.id, new_text_delta=text_delta.encode(article_2.text, 'Bad, broken news'),
+             proposer_id=user_1.id, article_version=article_2.version),
+    ], commit=False)
+    change_1, change_2 = changes
+
+    db_utils.create_entries(Review, [
+        dict(change_id=change_1.id, verdict=False, comment='Stop joking', reviewer_id=user_1.id),
+        dict(change_id=change_2.id, verdict=False, comment='Please, don`t ruin my articles', reviewer_id=user_2.id),
+    ], commit=False)
+
+    Session().commit()
+
+
+def username(user_id):
+    return f'user{user_id}'
+
+
+def staff_counts(users):
+    admins = max(1, users // 1000)
+    moderators = max(1, users // 50)
+    return admins, min(moderators, users - admins)
+
+
+class Zipf:
+    def __init__(self, rng, ids, skew):
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cumulative = list(accumulate(1 / rank ** skew for rank in range(1, len(self.ids) + 1)))
+
+    def weights(self):
+        previous = 0
+        for value in self.cumulative:
+            yield value - previous
+            previous = value
+
+    def sample(self, rng):
+        return self.ids[bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def random_round(rng, value):
+    whole = int(value)
+    return whole + (rng.random() < value - whole)
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def edit(rng, text):
+    words = text.split(' ')
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(words))
+        action = rng.random()
+        if action < 0.5:
+            words[position] = rng.choice(WORDS)
+        elif action < 0.75 and len(words) > 1:
+            del words[position]
+        else:
+            words.insert(position, rng.choice(WORDS))
+    return ' '.join(words)[:MAX_TEXT_LENGTH]
+
+
+class Loader:
+    def __init__(self, connection, method):
+        self.connection = connection
+        self.method = method
+        self.rows = {name: [] for name in TABLES}
+        self.pending = 0
+        self.loaded = dict.fromkeys(TABLES, 0)
+
+    def add(self, table_name, row):
+        self.rows[table_name].append(row)
+        self.pending += 1
+
+    # Tables are written in foreign key order, so a batch only refers to rows from this or earlier batches.
+    def flush(self):
+        for table_name, rows in self.rows.items():
+            if rows:
+                if self.method == 'copy':
+                    self.copy(table_name, rows)
+                else:
+                    self.insert(table_name, rows)
+                self.loaded[table_name] += len(rows)
+                rows.clear()
+        self.pending = 0
+
+    def copy(self, table_name, rows):
+        data = io.StringIO()
+        writer = csv.writer(data)
+        for row in rows:
+            writer.writerow(['\\N' if value is None else
+                             '\\x' + value.hex() if isinstance(value, bytes) else
+                             ('t' if value else 'f') if isinstance(value, bool) else value for value in row])
+        data.seek(0)
+        cursor = self.connection.connection.cursor()
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(TABLES[table_name])}) FROM STDIN WITH (FORMAT csv, "
+                           f"NULL '\\N')", data)
+
+    def insert(self, table_name, rows):
+        columns = TABLES[table_name]
+        stmt = table(table_name, *(column(name) for name in columns)).insert()
+        self.connection.execute(stmt, [dict(zip(columns, row)) for row in rows])
+
+
+def generate(*, users, articles, changes, seed=0, method=None, article_skew=0.8, user_skew=1.0, staff_skew=1.2,
+             in_review=0.15, accepted=0.25):
+    rng = random.Random(seed)
+    session = Session()
+    connection = session.connection()
+    if method is None:
+        method = 'copy' if connection.dialect.name == 'postgresql' else 'insert'
+    loader = Loader(connection, method)
+
+    admins, moderators = staff_counts(users)
+    password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    for user_id in range(1, users + 1):
+        user_status = 0 if user_id <= admins else 1 if user_id <= admins + moderators else 2
+        loader.add('users', (user_id, username(user_id), password, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                             f'{username(user_id)}@example.com', f'380{user_id:09d}', user_status))
+        if loader.pending >= BATCH_SIZE:
+            loader.flush()
+    loader.flush()
+
+    proposers = Zipf(rng, range(1, users + 1), user_skew)
+    staff = Zipf(rng, range(1, admins + moderators + 1), staff_skew)
+    popularity = Zipf(rng, range(1, articles + 1), article_skew)
+    proposals = [0] * articles
+    for article_id, weight in zip(popularity.ids, popularity.weights()):
+        proposals[article_id - 1] = random_round(rng, changes * weight / popularity.cumulative[-1])
+    total_changes = sum(proposals)
+    accept_share = accepted / (1 - in_review) if in_review < 1 else 0
+
+    change_index = review_id = 0
+    for article_id in range(1, articles + 1):
+        name = sentence(rng, rng.randint(2, 6))[:100]
+        article_text = sentence(rng, rng.randint(40, 200))[:MAX_TEXT_LENGTH]
+        version = snapshot_version = 0
+        snapshot_text = article_text
+        loader.add('article_revision', (article_id, version, None, name, text_delta.compress(article_text)))
+
+        count = proposals[article_id - 1]
+        pending = random_round(rng, count * in_review)
+        for index in range(count):
+            change_index += 1
+            change_id = change_index * CHANGE_ID_STRIDE % total_changes + 1
+            new_text = edit(rng, article_text)
+            if index >= count - pending:
+                status = 'in review'
+            else:
+                status = 'accepted' if rng.random() < accept_share else 'denied'
+            loader.add('change', (change_id, article_id, version, text_delta.encode(article_text, new_text), status,
+                                  proposers.sample(rng)))
+            if status == 'in review':
+                continue
+
+            review_id += 1
+            loader.add('review', (review_id, change_id, status == 'accepted',
+                                  'Looks good' if status == 'accepted' else 'Please rework', staff.sample(rng)))
+            if status == 'accepted':
+                version += 1
+                article_text = new_text
+                # the same revisions article_revisions.record would write
+                if version - snapshot_version >= article_revisions.SNAPSHOT_INTERVAL:
+                    snapshot_version, snapshot_text = version, article_text
+                    loader.add('article_revision', (article_id, version, None, name,
+                                                    text_delta.compress(article_text)))
+                else:
+                    loader.add('article_revision', (article_id, version, snapshot_version, name,
+                                                    text_delta.encode(snapshot_text, article_text)))
+
+        loader.add('article', (article_id, name, article_text, version, staff.sample(rng)))
+        if loader.pending >= BATCH_SIZE:
+            loader.flush()
+    loader.flush()
+
+    if connection.dialect.name == 'postgresql':
+        for table_name in ('users', 'article', 'change', 'review'):
+            connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), max(id)) "
+                                    f"FROM {table_name}"))
+    if article_search.uses_postgresql():
+        connection.execute(update(Article).values(search_vector=article_search.search_vector(Article.name,
+                                                                                             Article.text)))
+    session.commit()
+    article_search.clear()
+    return {'users': users, 'admins': admins, 'moderators': moderators, 'articles': articles,
+            'changes': total_changes, 'loaded': loader.loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, help='generate this many articles instead of the sample data')
+    parser.add_argument('--users', type=int, help='default: 5 per article')
+    parser.add_argument('--changes', type=int, help='default: 10 per article')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--method', choices=['copy', 'insert'], help='default: copy on PostgreSQL, else insert')
+    parser.add_argument('--article-skew', type=float, default=0.8, help='Zipf exponent of proposals per article')
+    parser.add_argument('--user-skew', type=float, default=1.0, help='Zipf exponent of proposals per user')
+    parser.add_argument('--staff-skew', type=float, default=1.2, help='Zipf exponent of reviews per moderator')
+    parser.add_argument('--in-review', type=float, default=0.15, help='share of changes still in review')
+    parser.add_argument('--accepted', type=float, default=0.25, help='share of changes accepted')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    if args.reset:
+        BaseModel.metadata.drop_all(engine)
+    BaseModel.metadata.create_all(engine)
+    if args.articles is None:
+        sample()
+        return
+
+    if Session.query(User.id).first() is not None:
+        parser.error('the database already has users; use --reset to start from empty tables')
+    started = time.perf_counter()
+    summary = generate(users=args.users or args.articles * 5, articles=args.articles,
+                       changes=args.changes if args.changes is not None else args.articles * 10, seed=args.seed,
+                       method=args.method, article_skew=args.article_skew, user_skew=args.user_skew,
+                       staff_skew=args.staff_skew, in_review=args.in_review, accepted=args.accepted)
+    loaded = ', '.join(f'{count} {table_name}' for table_name, count in summary['loaded'].items())
+    print(f'loaded {loaded} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
 
-session = Session()
-
-user_1 = User(username='m2', first_name='Jake', last_name='Kikman', email='jakkik@gmail.com',
-              password='11111', phone='380558695222', user_status=0)
-user_2 = User(username='softserve', first_name='Vanda', last_name='Maksimova', email='vanmak@gmail.com',
-              password='12345', phone='380962358712', user_status=1)
-article_1 = Article(name='IT news', text='Google is searching for ways to reassure people that it is still '
-                                         'out in front in the race for the best artificial intelligence technology. '
-                                         'And so far, the internet giant seems to be coming up with the wrong answer. '
-                                         'An advert designed to show off its new AI bot, showed it answering a query '
-                                         'incorrectly.',
-                    articleCreator=user_1, version=0)
-article_2 = Article(name='Kitties', text='A kitten is a juvenile cat. After being born, kittens display primary '
-                                         'altriciality and are totally dependent on their mothers for survival. They '
-                                         'normally do not open their eyes for seven to ten days. After about two weeks,'
-                                         'kittens develop quickly and begin to explore the world outside their nest. '
-                                         'After a further three to four weeks, they begin to eat solid food and grow '
-                                         'baby teeth. Domestic kittens are highly social animals and usually enjoy '
-                                         'human companionship.',
-                    articleCreator=user_2, version=0)
-change_1 = Change(articleChanged=article_1, new_text='Kitten, ha-ha-ha-ha', changeProposer=user_2,
-                  article_version=article_1.version, old_text=article_1.text)
-change_2 = Change(articleChanged=article_2, new_text='Bad, broken news', changeProposer=user_1,
-                  article_version=article_2.version, old_text=article_2.text)
-review_1 = Review(changeReviewed=change_1, verdict=0, comment='Stop joking', reviewer=user_1)
-review_2 = Review(changeReviewed=change_2, verdict=0, comment='Please, don`t ruin my articles', reviewer=user_2)
-#
-session.add_all([user_1, user_2, article_1, article_2, change_1, change_2, review_1, review_2])
-
-session.commit()
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ CREATE TABLE users(
    last_name VARCHAR (20) NOT NULL,
    email VARCHAR(100) NOT NULL,
    user_status INT NOT NULL,
+   token_version INT NOT NULL DEFAULT 0,
    CONSTRAINT unique_username UNIQUE(username)
 );
 
@@ -17,19 +18,31 @@ CREATE TABLE article(
     text VARCHAR(2000) NOT NULL,
     version INT NOT NULL,
     creator_id INT NOT NULL,
+    search_vector TSVECTOR,
     CONSTRAINT fk_creatorId FOREIGN KEY (creator_id) REFERENCES users (id)
 );
 
 
+CREATE TABLE article_revision(
+    article_id INT NOT NULL,
+    version INT NOT NULL,
+    base_version INT,
+    name VARCHAR(100),
+    text_data BYTEA NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (article_id, version),
+    CONSTRAINT fk_revisionArticleId FOREIGN KEY (article_id) REFERENCES article (id) ON DELETE CASCADE
+);
+
+
 CREATE TABLE change(
     id SERIAL PRIMARY KEY,
     article_id INT NOT NULL,
     article_version INT NOT NULL,
-    old_text VARCHAR(2000) NOT NULL,
-    new_text VARCHAR(2000) NOT NULL,
+    new_text_delta BYTEA NOT NULL,
     status VARCHAR(9) NOT NULL,
     proposer_id INT NOT NULL,
-    CONSTRAINT fk_articleId FOREIGN KEY (article_id) REFERENCES article (id),
+    CONSTRAINT fk_articleId FOREIGN KEY (article_id) REFERENCES article (id) ON DELETE CASCADE,
     CONSTRAINT fk_proposerId FOREIGN KEY (proposer_id) REFERENCES users (id)
 );
 
@@ -41,12 +54,25 @@ CREATE TABLE review(
     comment VARCHAR(200) NOT NULL,
     reviewer_id INT NOT NULL,
     CONSTRAINT unique_changeId UNIQUE(change_id),
-    CONSTRAINT fk_changeId FOREIGN KEY (change_id) REFERENCES change (id),
+    CONSTRAINT fk_changeId FOREIGN KEY (change_id) REFERENCES change (id) ON DELETE CASCADE,
     CONSTRAINT fk_reviewerId FOREIGN KEY (reviewer_id) REFERENCES users (id)
 );
 
 
+CREATE TABLE job(
+    id VARCHAR(32) PRIMARY KEY,
+    owner_id INT NOT NULL,
+    status VARCHAR(7) NOT NULL,
+    error TEXT,
+    finished_at TIMESTAMP
+);
 
 
-
-
+CREATE INDEX ix_article_creator_id ON article (creator_id);
+CREATE INDEX ix_article_catalog ON article (id) INCLUDE (name, version, creator_id);
+CREATE INDEX ix_article_search_vector ON article USING gin (search_vector);
+CREATE INDEX ix_change_article_id ON change (article_id);
+CREATE INDEX ix_change_proposer_id_id ON change (proposer_id, id);
+CREATE INDEX ix_change_in_review ON change (article_id, article_version) WHERE status = 'in review';
+CREATE INDEX ix_change_in_review_id ON change (id) WHERE status = 'in review';
+CREATE INDEX ix_review_reviewer_id_id ON review (reviewer_id, id);
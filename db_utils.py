@@ -1,31 +1,150 @@
+from contextlib import contextmanager
+
 from models import *
+from schemas import get_schema
+
+
+BULK_INSERT_BATCH_SIZE = 1000
+# SQLAlchemy 1.4 only emits RETURNING for PostgreSQL-like dialects; elsewhere written rows are read back by key
+RETURNING = engine.dialect.full_returning
+
+
+class VersionConflict(Exception):
+    pass
+
+
+def returning_columns(model_class):
+    return [prop.columns[0] for prop in inspect(model_class).column_attrs if not prop.deferred]
+
+
+def select_returning(model_class, stmt):
+    return select(model_class).from_statement(stmt.returning(*returning_columns(model_class))) \
+        .execution_options(populate_existing=True)
+
+
+def read_back(session, model_class, key):
+    key_filter = and_(*(column == value for column, value in zip(inspect(model_class).primary_key, key)))
+    return session.execute(
+        select(model_class).where(key_filter).execution_options(populate_existing=True)
+    ).scalar_one()
+
+
+def insert_entries(session, model_class, rows):
+    if RETURNING:
+        return session.execute(select_returning(model_class, insert(model_class).values(rows))).scalars().all()
+    keys = [session.execute(insert(model_class).values(row)).inserted_primary_key for row in rows]
+    return [read_back(session, model_class, key) for key in keys]
 
 
 def create_entry(model_class, *, commit=True, **kwargs):
     session = Session()
-    session.expire_on_commit = false
-    entry = model_class(**kwargs)
-    session.add(entry)
+    entry, = insert_entries(session, model_class, [kwargs])
+    if commit:
+        session.commit()
+    return entry
+
+
+def create_entries(model_class, rows, *, commit=True, batch_size=BULK_INSERT_BATCH_SIZE):
+    session = Session()
+    rows = list(rows)
+    entries = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        entries.extend(insert_entries(session, model_class, batch))
     if commit:
         session.commit()
-    return session.query(model_class).order_by(desc(model_class.id)).first()
+    return entries
+
+
+def paginate(query, key, *, after=None, limit=100):
+    if after is not None:
+        query = query.filter(key > after)
+    entries = query.order_by(key).limit(limit + 1).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = getattr(entries[-1], key.key)
+    return entries, next_cursor
 
 
-def get_entry_by_id(model_class, id, **kwargs):
+def schema_columns(model_class, schema_class, only=None):
+    derived_columns = getattr(model_class, 'derived_columns', {})
+    derived_options = getattr(model_class, 'derived_options', {})
+    names = dict.fromkeys(column for name in get_schema(schema_class, only).dump_fields
+                          for column in derived_columns.get(name, (name,)))
+    return [load_only(*(getattr(model_class, name) for name in names if name in model_class.__table__.c)),
+            *(derived_options[name]() for name in names if name in derived_options)]
+
+
+def get_entry_by_id(model_class, id, *, options=(), **kwargs):
     session = Session()
-    return session.query(model_class).filter_by(id=id, **kwargs).one()
+    return session.query(model_class).options(*options).filter_by(id=id, **kwargs).one()
+
+
+def get_entries_by_ids(model_class, ids, *, options=()):
+    session = Session()
+    entries = session.query(model_class).options(*options).filter(model_class.id.in_(sorted(set(ids)))).all()
+    return {entry.id: entry for entry in entries}
 
 
 def update_entry(model_class, id, *, commit=True, **kwargs):
     session = Session()
-    for key, value in kwargs.items():
-        session.query(model_class).filter(model_class.id == id).update({key: value})
+    if not kwargs:
+        return get_entry_by_id(model_class, id)
+    stmt = update(model_class).where(model_class.id == id).values(**kwargs)
+    if RETURNING:
+        entry = session.execute(select_returning(model_class, stmt)).scalar_one()
+    else:
+        session.execute(stmt)
+        entry = read_back(session, model_class, (id,))
+    if commit:
+        session.commit()
+    return entry
+
+
+# version may also be a list of versions, any of which the entry has to be at
+def update_versioned(model_class, id, version, *, commit=True, **kwargs):
+    session = Session()
+    versions = version if isinstance(version, list) else [version]
+    stmt = update(model_class).where(model_class.id == id, model_class.version.in_(versions)) \
+        .values(version=model_class.version + 1, **kwargs)
+    if RETURNING:
+        entry = session.execute(select_returning(model_class, stmt)).scalar_one_or_none()
+    elif session.execute(stmt).rowcount:
+        entry = read_back(session, model_class, (id,))
+    else:
+        entry = None
+    if entry is None:
+        if not versions:
+            raise VersionConflict(f'{model_class.__name__} {id} has no version it is expected to be at')
+        raise VersionConflict(f'{model_class.__name__} {id} is no longer at version {" or ".join(map(str, versions))}')
     if commit:
         session.commit()
-    entry = session.query(model_class).filter_by(id=id, **kwargs).one()
     return entry
 
 
+def update_where(model_class, filter, values, *, commit=True):
+    session = Session()
+    if isinstance(filter, dict):
+        filter = and_(*(getattr(model_class, key) == value for key, value in filter.items()))
+    result = session.execute(update(model_class).where(filter).values(values))
+    if commit:
+        session.commit()
+    return result.rowcount
+
+
+def delete_where(model_class, filter, *, commit=True, synchronize_session='evaluate'):
+    session = Session()
+    if isinstance(filter, dict):
+        filter = and_(*(getattr(model_class, key) == value for key, value in filter.items()))
+    result = session.execute(
+        delete(model_class).where(filter).execution_options(synchronize_session=synchronize_session)
+    )
+    if commit:
+        session.commit()
+    return result.rowcount
+
+
 def delete_entry(model_class, id, commit=True, **kwargs):
     session = Session()
     entry = session.query(model_class).filter_by(id=id, **kwargs).one()
@@ -33,3 +152,14 @@ def delete_entry(model_class, id, commit=True, **kwargs):
         session.query(model_class).filter_by(id=id, **kwargs).delete()
     if commit:
         session.commit()
+
+
+@contextmanager
+def transaction():
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+wsgi_app = 'app:app'
+
+
+def post_fork(server, worker):
+    from models import engine
+
+    engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    import jobs
+    from models import engine
+
+    jobs.executor.shutdown(wait=True)
+    engine.dispose()
@@ -0,0 +1,52 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+import db_utils
+from models import Session, Job
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('JOB_WORKERS', 2)))
+# finished jobs stay visible at /api/job/<id> for this many seconds
+JOB_TTL = float(os.environ.get('JOB_TTL', 3600))
+
+
+# Job status lives in the database, so it can be polled from any worker process, not only the one running the job.
+def submit(owner_id, fn, *args, **kwargs):
+    evict_finished()
+    job = db_utils.create_entry(Job, id=uuid.uuid4().hex, owner_id=owner_id, status='pending')
+    job.future = executor.submit(run, job.id, fn, *args, **kwargs)
+    return job
+
+
+def run(job_id, fn, *args, **kwargs):
+    try:
+        db_utils.update_entry(Job, job_id, status='running')
+        try:
+            fn(*args, **kwargs)
+        except Exception as error:
+            Session.rollback()
+            db_utils.update_entry(Job, job_id, status='failed', error=str(error), finished_at=datetime.utcnow())
+            raise
+        db_utils.update_entry(Job, job_id, status='done', finished_at=datetime.utcnow())
+    finally:
+        Session.remove()
+
+
+def expired_before():
+    return datetime.utcnow() - timedelta(seconds=JOB_TTL)
+
+
+def evict_finished():
+    db_utils.delete_where(Job, Job.finished_at <= expired_before(), commit=False, synchronize_session=False)
+
+
+def get(job_id):
+    return Session.query(Job).populate_existing() \
+        .filter(Job.id == job_id, or_(Job.finished_at.is_(None), Job.finished_at > expired_before())).first()
+
+
+def job_info(job):
+    return {'id': job.id, 'status': job.status, 'error': job.error}
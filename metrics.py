@@ -0,0 +1,151 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import engine, pool_status
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metrics live in the process; under gunicorn every worker reports its own.
+metrics_lock = Lock()
+registry = []
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series = {}
+        registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with metrics_lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self.series.items()):
+            yield f'{self.name}{format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with metrics_lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        for label_values, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{format_labels(self.labels, label_values, [("le", bound)])} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labels, label_values)} {total}'
+            yield f'{self.name}_count{format_labels(self.labels, label_values)} {cumulative}'
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests', ('method', 'route', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', 'HTTP request latency', ('method', 'route'))
+http_request_queries = Histogram('http_request_db_queries', 'SQL statements per HTTP request', ('method', 'route'),
+                                 buckets=COUNT_BUCKETS)
+db_query_duration = Histogram('db_query_duration_seconds', 'SQL statement execution time')
+auth_duration = Histogram('auth_duration_seconds', 'Time spent verifying credentials', ('scheme',))
+serialization_duration = Histogram('serialization_duration_seconds', 'Time spent dumping response bodies',
+                                   ('schema',))
+
+
+@event.listens_for(engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metrics_started
+    db_query_duration.observe(elapsed)
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+
+
+@contextmanager
+def timed(histogram, *label_values):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *label_values)
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = 0
+
+
+def finish_request(response):
+    if 'metrics_started' not in g:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_request_duration.observe(time.perf_counter() - g.metrics_started, request.method, route)
+    http_request_queries.observe(g.metrics_queries, request.method, route)
+    http_requests.inc(request.method, route, response.status_code)
+    return response
+
+
+def pool_samples():
+    stats = pool_status()
+    gauges = [('db_pool_size', 'size'), ('db_pool_checked_in', 'checked_in'),
+              ('db_pool_checked_out', 'checked_out'), ('db_pool_overflow', 'overflow'),
+              ('db_pool_wait_seconds_max', 'wait_seconds_max')]
+    for name, key in gauges:
+        yield f'# TYPE {name} gauge'
+        yield f'{name} {stats[key]}'
+    for name, key in [('db_pool_checkouts_total', 'checkouts'), ('db_pool_wait_seconds_total', 'wait_seconds_total')]:
+        yield f'# TYPE {name} counter'
+        yield f'{name} {stats[key]}'
+
+
+def render():
+    lines = []
+    with metrics_lock:
+        for metric in registry:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+    lines.extend(pool_samples())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with metrics_lock:
+        for metric in registry:
+            metric.series.clear()
@@ -0,0 +1,71 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from models import BaseModel, engine
+
+# this is the Alembic Config object, which provides
+# access to the values within the .ini file in use.
+config = context.config
+
+# Interpret the config file for Python logging.
+# This line sets up loggers basically.
+if config.config_file_name is not None and config.attributes.get('configure_logger', True):
+    fileConfig(config.config_file_name)
+
+target_metadata = BaseModel.metadata
+
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode.
+
+    This emits the SQL of the migrations for the database URL the
+    application uses, without connecting to it.
+
+    """
+    context.configure(
+        url=engine.url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode.
+
+    Uses the application engine from models.py, or a connection passed
+    in through config.attributes['connection'] (as the tests do).
+
+    """
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    with engine.connect() as connection:
+        run_migrations(connection)
+
+
+def run_migrations(connection) -> None:
+    sqlite = connection.dialect.name == 'sqlite'
+    # SQLite cannot alter constraints, so operations on it are batched: the table is recreated and the old one
+    # dropped, which enforced foreign keys would refuse or cascade into the rows that reference it
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=sqlite)
+    if sqlite:
+        connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+    try:
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys = ON')
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,35 @@
+"""indexes for hot queries
+
+Revision ID: 1feb089b47e0
+Revises: cc2fad012b75
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1feb089b47e0'
+down_revision = 'cc2fad012b75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_article_creator_id', 'article', ['creator_id'])
+    op.create_index('ix_change_article_id', 'change', ['article_id'])
+    op.create_index('ix_change_proposer_id_id', 'change', ['proposer_id', 'id'])
+    op.create_index('ix_change_in_review', 'change', ['article_id', 'article_version'],
+                    postgresql_where=sa.text("status = 'in review'"))
+    op.create_index('ix_change_in_review_id', 'change', ['id'], postgresql_where=sa.text("status = 'in review'"))
+    op.create_index('ix_review_reviewer_id_id', 'review', ['reviewer_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_review_reviewer_id_id', table_name='review')
+    op.drop_index('ix_change_in_review_id', table_name='change')
+    op.drop_index('ix_change_in_review', table_name='change')
+    op.drop_index('ix_change_proposer_id_id', table_name='change')
+    op.drop_index('ix_change_article_id', table_name='change')
+    op.drop_index('ix_article_creator_id', table_name='article')
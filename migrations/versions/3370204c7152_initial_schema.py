@@ -0,0 +1,74 @@
+"""initial schema
+
+Revision ID: 3370204c7152
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3370204c7152'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), sa.Identity(start=1, cycle=False), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('password', sa.String(), nullable=True),
+        sa.Column('first_name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('user_status', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table(
+        'article',
+        sa.Column('id', sa.Integer(), sa.Identity(start=1, cycle=False), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('text', sa.String(length=2000), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=True),
+        sa.Column('creator_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'change',
+        sa.Column('id', sa.Integer(), sa.Identity(start=1, cycle=False), nullable=False),
+        sa.Column('article_id', sa.Integer(), nullable=True),
+        sa.Column('article_version', sa.Integer(), nullable=True),
+        sa.Column('old_text', sa.String(length=2000), nullable=True),
+        sa.Column('new_text', sa.String(length=2000), nullable=True),
+        sa.Column('status', sa.String(length=9), nullable=True),
+        sa.Column('proposer_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['article_id'], ['article.id'], ),
+        sa.ForeignKeyConstraint(['proposer_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'review',
+        sa.Column('id', sa.Integer(), sa.Identity(start=1, cycle=False), nullable=False),
+        sa.Column('change_id', sa.Integer(), nullable=True),
+        sa.Column('verdict', sa.Boolean(), nullable=True),
+        sa.Column('comment', sa.String(length=200), nullable=True),
+        sa.Column('reviewer_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['change_id'], ['change.id'], ),
+        sa.ForeignKeyConstraint(['reviewer_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('change_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('review')
+    op.drop_table('change')
+    op.drop_table('article')
+    op.drop_table('users')
@@ -0,0 +1,24 @@
+"""article catalog index
+
+Revision ID: 4c8e1f2b6a07
+Revises: e27a5c0d9f13
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e1f2b6a07'
+down_revision = 'e27a5c0d9f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_article_catalog', 'article', ['id'], postgresql_include=['name', 'version', 'creator_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_article_catalog', table_name='article')
@@ -0,0 +1,77 @@
+"""delta compressed change text
+
+Revision ID: 5b0f6d9e2a41
+Revises: 1feb089b47e0
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import text_delta
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0f6d9e2a41'
+down_revision = '1feb089b47e0'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+change = sa.table(
+    'change',
+    sa.column('id', sa.Integer),
+    sa.column('old_text', sa.String),
+    sa.column('new_text', sa.String),
+    sa.column('old_text_compressed', sa.LargeBinary),
+    sa.column('new_text_delta', sa.LargeBinary),
+    sa.column('old_text_plain', sa.String),
+)
+
+
+def convert_rows(source_columns, target_columns, convert):
+    connection = op.get_bind()
+    update = change.update().where(change.c.id == sa.bindparam('row_id')) \
+        .values({name: sa.bindparam(f'{name}_value') for name in target_columns})
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(change.c.id, *(change.c[name] for name in source_columns))
+            .where(change.c.id > last_id).order_by(change.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'row_id': row[0], **{f'{name}_value': value for name, value in zip(target_columns, convert(*row[1:]))}}
+            for row in rows
+        ])
+        last_id = rows[-1][0]
+
+
+def compress(old_text, new_text):
+    return (None if old_text is None else text_delta.compress(old_text),
+            None if new_text is None else text_delta.encode(old_text or '', new_text))
+
+
+def decompress(old_text, new_text_delta):
+    old_text = None if old_text is None else text_delta.decompress(old_text)
+    return old_text, None if new_text_delta is None else text_delta.decode(old_text or '', new_text_delta)
+
+
+def upgrade() -> None:
+    op.add_column('change', sa.Column('old_text_compressed', sa.LargeBinary()))
+    op.add_column('change', sa.Column('new_text_delta', sa.LargeBinary()))
+    convert_rows(('old_text', 'new_text'), ('old_text_compressed', 'new_text_delta'), compress)
+    op.drop_column('change', 'new_text')
+    op.drop_column('change', 'old_text')
+    op.alter_column('change', 'old_text_compressed', new_column_name='old_text')
+
+
+def downgrade() -> None:
+    op.add_column('change', sa.Column('old_text_plain', sa.String(length=2000)))
+    op.add_column('change', sa.Column('new_text', sa.String(length=2000)))
+    convert_rows(('old_text', 'new_text_delta'), ('old_text_plain', 'new_text'), decompress)
+    op.drop_column('change', 'new_text_delta')
+    op.drop_column('change', 'old_text')
+    op.alter_column('change', 'old_text_plain', new_column_name='old_text')
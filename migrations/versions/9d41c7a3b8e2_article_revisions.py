@@ -0,0 +1,63 @@
+"""article revisions
+
+Revision ID: 9d41c7a3b8e2
+Revises: 5b0f6d9e2a41
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import text_delta
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41c7a3b8e2'
+down_revision = '5b0f6d9e2a41'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+article = sa.table(
+    'article',
+    sa.column('id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('text', sa.String),
+    sa.column('version', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    article_revision = op.create_table(
+        'article_revision',
+        sa.Column('article_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('base_version', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('text_data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['article_id'], ['article.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('article_id', 'version'),
+    )
+
+    # Earlier versions were overwritten in place, so history starts with a snapshot of the current one.
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(article.c.id, article.c.name, article.c.text, article.c.version)
+            .where(article.c.id > last_id).order_by(article.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        op.bulk_insert(article_revision, [
+            {'article_id': row.id, 'version': row.version or 0, 'name': row.name,
+             'text_data': text_delta.compress(row.text or '')}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    op.drop_table('article_revision')
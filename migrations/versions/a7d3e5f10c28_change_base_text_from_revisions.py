@@ -0,0 +1,82 @@
+"""change base text from revisions
+
+Revision ID: a7d3e5f10c28
+Revises: 4c8e1f2b6a07
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import text_delta
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f10c28'
+down_revision = '4c8e1f2b6a07'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+change = sa.table(
+    'change',
+    sa.column('id', sa.Integer),
+    sa.column('article_id', sa.Integer),
+    sa.column('article_version', sa.Integer),
+    sa.column('old_text', sa.LargeBinary),
+)
+
+article_revision = sa.table(
+    'article_revision',
+    sa.column('article_id', sa.Integer),
+    sa.column('version', sa.Integer),
+    sa.column('base_version', sa.Integer),
+    sa.column('text_data', sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    # Changes against versions that were overwritten before history was kept hold the only copy of that text.
+    # It is stored the way snapshots are, so it becomes the revision for that version.
+    first_changes = sa.select(sa.func.min(change.c.id)).where(change.c.article_version.isnot(None)) \
+        .group_by(change.c.article_id, change.c.article_version)
+    missing = sa.select(change.c.article_id, change.c.article_version, change.c.old_text).where(
+        change.c.id.in_(first_changes),
+        change.c.old_text.isnot(None),
+        ~sa.exists().where(sa.and_(article_revision.c.article_id == change.c.article_id,
+                                   article_revision.c.version == change.c.article_version)),
+    )
+    op.execute(article_revision.insert().from_select(['article_id', 'version', 'text_data'], missing))
+    op.drop_column('change', 'old_text')
+
+
+def downgrade() -> None:
+    op.add_column('change', sa.Column('old_text', sa.LargeBinary()))
+
+    connection = op.get_bind()
+    base = article_revision.alias('base')
+    update = change.update().where(change.c.id == sa.bindparam('row_id')) \
+        .values(old_text=sa.bindparam('old_text_value'))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(change.c.id, article_revision.c.text_data, base.c.text_data)
+            .select_from(change.join(article_revision, sa.and_(
+                article_revision.c.article_id == change.c.article_id,
+                article_revision.c.version == change.c.article_version,
+            )).outerjoin(base, sa.and_(
+                base.c.article_id == article_revision.c.article_id,
+                base.c.version == article_revision.c.base_version,
+            )))
+            .where(change.c.id > last_id).order_by(change.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'row_id': row_id,
+             'old_text_value': text_data if base_data is None else
+             text_delta.compress(text_delta.decode(text_delta.decompress(base_data), text_data))}
+            for row_id, text_data, base_data in rows
+        ])
+        last_id = rows[-1][0]
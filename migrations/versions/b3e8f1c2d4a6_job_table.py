@@ -0,0 +1,32 @@
+"""job table
+
+Revision ID: b3e8f1c2d4a6
+Revises: a7d3e5f10c28
+Create Date: 2026-10-18 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f1c2d4a6'
+down_revision = 'a7d3e5f10c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=7), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job')
@@ -0,0 +1,39 @@
+"""token version and cascading deletes
+
+Revision ID: cc2fad012b75
+Revises: 3370204c7152
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cc2fad012b75'
+down_revision = '3370204c7152'
+branch_labels = None
+depends_on = None
+
+
+# SQLite cannot alter constraints, so there the batch recreates the table. Its foreign keys are unnamed and get the
+# name PostgreSQL would have given them.
+def replace_foreign_key(table, column, referent, **kwargs):
+    name = f'{table}_{column}_fkey'
+    with op.batch_alter_table(table, naming_convention={'fk': '%(table_name)s_%(column_0_name)s_fkey'}) as batch_op:
+        for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table):
+            if foreign_key['constrained_columns'] == [column]:
+                batch_op.drop_constraint(foreign_key['name'] or name, type_='foreignkey')
+        batch_op.create_foreign_key(name, referent, [column], ['id'], **kwargs)
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    replace_foreign_key('change', 'article_id', 'article', ondelete='CASCADE')
+    replace_foreign_key('review', 'change_id', 'change', ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    replace_foreign_key('review', 'change_id', 'change')
+    replace_foreign_key('change', 'article_id', 'article')
+    op.drop_column('users', 'token_version')
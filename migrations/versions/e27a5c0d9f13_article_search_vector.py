@@ -0,0 +1,39 @@
+"""article search vector
+
+Revision ID: e27a5c0d9f13
+Revises: 9d41c7a3b8e2
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27a5c0d9f13'
+down_revision = '9d41c7a3b8e2'
+branch_labels = None
+depends_on = None
+
+# the text search configuration article_search queries with
+SEARCH_CONFIG = os.environ.get('ARTICLE_SEARCH_CONFIG', 'english')
+
+
+def upgrade() -> None:
+    op.add_column('article', sa.Column('search_vector', postgresql.TSVECTOR().with_variant(sa.Text(), 'sqlite'),
+                                       nullable=True))
+    # elsewhere article_search keeps its index in memory and the column stays empty
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(sa.text("UPDATE article SET search_vector = "
+                           "setweight(to_tsvector(CAST(:config AS regconfig), coalesce(name, '')), 'A') || "
+                           "setweight(to_tsvector(CAST(:config AS regconfig), coalesce(text, '')), 'B')")
+                   .bindparams(config=SEARCH_CONFIG))
+    op.create_index('ix_article_search_vector', 'article', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_article_search_vector', table_name='article')
+    op.drop_column('article', 'search_vector')
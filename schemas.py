@@ -1,11 +1,16 @@
-from flask_bcrypt import generate_password_hash
-from marshmallow import validate, Schema, fields
+from functools import lru_cache
+
+from flask_bcrypt import Bcrypt
+from marshmallow import validate, Schema, fields, EXCLUDE, ValidationError
+
+# the cost comes from BCRYPT_LOG_ROUNDS once app.py calls init_app
+bcrypt = Bcrypt()
 
 
 class UserCreate(Schema):
     username = fields.String(required=True)
     password = fields.Function(
-        deserialize=lambda obj: generate_password_hash(obj).decode('utf-8'), load_only=True, required=True
+        deserialize=lambda obj: bcrypt.generate_password_hash(obj).decode('utf-8'), load_only=True, required=True
     )
     first_name = fields.String(required=True)
     last_name = fields.String(required=True)
@@ -29,7 +34,7 @@ class UserChangeStatus(Schema):
 
 class UserUpdate(Schema):
     password = fields.Function(
-        deserialize=lambda obj: generate_password_hash(obj).decode('utf-8'), load_only=True
+        deserialize=lambda obj: bcrypt.generate_password_hash(obj).decode('utf-8'), load_only=True
     )
     first_name = fields.String()
     last_name = fields.String()
@@ -55,6 +60,46 @@ class ArticleInfo(Schema):
     creator_id = fields.String()
 
 
+class ArticleVersionArgs(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    version = fields.Integer(load_default=None, validate=validate.Range(min=0))
+
+
+class ArticleRevisionInfo(Schema):
+    article_id = fields.Integer()
+    version = fields.Integer()
+    name = fields.String()
+    created_at = fields.DateTime()
+
+
+def load_search_cursor(value):
+    rank, _, article_id = value.partition(',')
+    try:
+        return float(rank), int(article_id)
+    except ValueError:
+        raise ValidationError('Not a valid search cursor.') from None
+
+
+class ArticleSearchArgs(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    q = fields.String(required=True, validate=validate.Length(min=1, max=200))
+    limit = fields.Integer(load_default=20, validate=validate.Range(min=1, max=100))
+    after = fields.Function(deserialize=load_search_cursor, load_default=None)
+
+
+class ArticleSearchResult(Schema):
+    id = fields.Integer()
+    name = fields.String()
+    version = fields.Integer()
+    creator_id = fields.String()
+    rank = fields.Float()
+    headline = fields.String()
+
+
 class ChangeCreate(Schema):
     article_id = fields.Integer(required=True)
     new_text = fields.String(required=True)
@@ -87,3 +132,50 @@ class ReviewInfo(Schema):
     verdict = fields.Boolean()
     comment = fields.String()
     reviewer_id = fields.Integer()
+
+
+MAX_BATCH_IDS = 100
+
+
+class BatchGet(Schema):
+    ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=MAX_BATCH_IDS))
+
+
+def load_id_list(value):
+    try:
+        ids = [int(item) for item in value.split(',')]
+    except ValueError:
+        raise ValidationError('Not a valid comma-separated list of ids.') from None
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValidationError(f'Longer than maximum length {MAX_BATCH_IDS}.')
+    return ids
+
+
+class PageArgs(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    limit = fields.Integer(load_default=100, validate=validate.Range(min=1, max=1000))
+    after = fields.Integer(load_default=None)
+
+
+def field_names(schema_class):
+    def load(value):
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in get_schema(schema_class).dump_fields]
+        if not names or unknown:
+            raise ValidationError(f'Unknown fields: {", ".join(unknown) or value}.')
+        return names
+    return load
+
+
+class ArticleListArgs(PageArgs):
+    creator_id = fields.Integer(load_default=None)
+    min_version = fields.Integer(load_default=None, validate=validate.Range(min=0))
+    only = fields.Function(deserialize=field_names(ArticleInfo), data_key='fields', load_default=None)
+    ids = fields.Function(deserialize=load_id_list, load_default=None)
+
+
+@lru_cache(maxsize=None)
+def get_schema(schema_class, only=None):
+    return schema_class(only=only)
@@ -0,0 +1,108 @@
+import json
+import time
+from functools import lru_cache
+
+from flask import current_app
+from marshmallow import fields
+
+import metrics
+from schemas import get_schema
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dump_integer(value):
+    return None if value is None else int(value)
+
+
+def dump_string(value):
+    return None if value is None else str(value)
+
+
+def dump_float(value):
+    return None if value is None else float(value)
+
+
+def dump_boolean(value):
+    return None if value is None else bool(value)
+
+
+CONVERTERS = {
+    fields.Integer: dump_integer,
+    fields.String: dump_string,
+    fields.Email: dump_string,
+    fields.Float: dump_float,
+    fields.Boolean: dump_boolean,
+}
+
+
+@lru_cache(maxsize=None)
+def get_dumper(schema_class, only=None):
+    schema = get_schema(schema_class, only)
+    namespace = {}
+    items = []
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        converter = CONVERTERS.get(type(field))
+        if converter is None:
+            return schema.dump
+        namespace[f'convert_{index}'] = converter
+        items.append(f'{field.data_key or name!r}: convert_{index}(obj.{field.attribute or name})')
+
+    source = 'def dump(obj):\n    return {' + ', '.join(items) + '}\n'
+    exec(compile(source, f'<dump {schema_class.__name__}>', 'exec'), namespace)
+    return namespace['dump']
+
+
+# None when the schema has fields whose output type is not known up front
+@lru_cache(maxsize=None)
+def dumps_floats(schema_class, only=None):
+    schema = get_schema(schema_class, only)
+    if any(type(field) not in CONVERTERS for field in schema.dump_fields.values()):
+        return None
+    return any(type(field) is fields.Float for field in schema.dump_fields.values())
+
+
+def contains_float(data):
+    if isinstance(data, float):
+        return True
+    if isinstance(data, dict):
+        return any(contains_float(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(contains_float(value) for value in data)
+    return False
+
+
+def dump(schema_class, obj, many=False, only=None):
+    started = time.perf_counter()
+    dumper = get_dumper(schema_class, only)
+    data = [dumper(item) for item in obj] if many else dumper(obj)
+    metrics.serialization_duration.observe(time.perf_counter() - started, schema_class.__name__)
+    return data
+
+
+# orjson writes some floats differently from json (0.00001 for 1e-05, 1e16 for 1e+16), so bodies with floats
+# go through json to stay byte-identical to jsonify.
+def encode(data, floats=None):
+    if floats is None:
+        floats = contains_float(data)
+    if orjson is not None and not floats:
+        try:
+            body = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            body = None
+        if body is not None and body.isascii() and b'\x7f' not in body:
+            return body
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode('ascii')
+
+
+def dump_response(schema_class, obj, many=False, only=None):
+    return response(dump(schema_class, obj, many=many, only=only), floats=dumps_floats(schema_class, only))
+
+
+def response(data, floats=None):
+    if current_app.json.compact is False or (current_app.json.compact is None and current_app.debug):
+        return current_app.json.response(data)
+    return current_app.response_class(encode(data, floats) + b'\n', mimetype='application/json')
@@ -0,0 +1,25 @@
+import zlib
+
+COMPRESSION_LEVEL = 9
+# Raw deflate streams: rows are short, so the zlib header and checksum would be a noticeable share of each value.
+WBITS = -zlib.MAX_WBITS
+
+
+def compress(text):
+    return encode('', text)
+
+
+def decompress(data):
+    return decode('', data)
+
+
+# The base text is used as a preset deflate dictionary, so the parts of `text` that it shares with `base` are
+# stored as back-references into it. Texts are far below the 32 KiB deflate window, so all of `base` is reachable.
+def encode(base, text):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, WBITS, zdict=base.encode('utf-8'))
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def decode(base, delta):
+    decompressor = zlib.decompressobj(WBITS, zdict=base.encode('utf-8'))
+    return (decompressor.decompress(delta) + decompressor.flush()).decode('utf-8')